@@ -0,0 +1,48 @@
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "throughput_per_s")
+
+def flatten(stages, prefix=""):
+    # {"clean": {"chunk": {...}}} → {"clean.chunk": {...}} (지표가 있는 항목만)
+    flat = {}
+    for name, value in stages.items():
+        if not isinstance(value, dict):
+            continue
+        key = f"{prefix}{name}"
+        if any(metric in value for metric in METRICS):
+            flat[key] = value
+        flat.update(flatten(value, key + "."))
+    return flat
+
+def compare(baseline, current, threshold):
+    # 지연은 늘어나면, 처리량은 줄어들면 회귀로 본다
+    regressions = []
+    base_stages, current_stages = flatten(baseline["stages"]), flatten(current["stages"])
+    for key in sorted(set(base_stages) & set(current_stages)):
+        for metric in METRICS:
+            before, after = base_stages[key].get(metric), current_stages[key].get(metric)
+            if not before or after is None:
+                continue
+            change = after / before - 1
+            worse = change > threshold if metric != "throughput_per_s" else change < -threshold
+            marker = "  <-- 회귀" if worse else ""
+            print(f"{key:40s} {metric:18s} {before:12.3f} → {after:12.3f} ({change:+.1%}){marker}")
+            if worse:
+                regressions.append((key, metric, change))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="두 벤치마크 결과 JSON 비교")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1, help="회귀로 볼 변화율 (기본 10%%)")
+    args = parser.parse_args()
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+    if compare(baseline, current, args.threshold):
+        sys.exit(1)
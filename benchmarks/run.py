@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from synthetic import corpus_token_stats, make_corpus, make_recipes
+from stub_servers import StubConfig, start_stub_server
+
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+UPLOAD_INDEX = "bench-openai"
+LOCAL_ENCODER_INDEX = "bench-minilm"
+
+def summarize(latencies, wall_time=None):
+    # 지연 시간(초) 목록 → 처리량과 p50/p95/p99 (ms)
+    if not latencies:
+        return {"count": 0}
+    values = np.asarray(latencies) * 1000
+    wall_time = wall_time if wall_time is not None else float(np.sum(latencies))
+    return {
+        "count": len(latencies),
+        "total_s": round(wall_time, 4),
+        "throughput_per_s": round(len(latencies) / wall_time, 2) if wall_time > 0 else None,
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def run_concurrently(func, items, concurrency):
+    # items 각각에 func을 concurrency개 스레드로 실행하고 (지연 시간 목록, 전체 시간)을 돌려준다
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = [latency for _, latency in executor.map(lambda item: timed(func, item), items)]
+    return latencies, time.perf_counter() - start
+
+def bench_crawl_parse(pages):
+    from http_fetcher import extract_embedded_product, extract_next_data, parse_page
+    from product_parser import parse_product
+
+    def parse(page):
+        text = parse_page(page).text()
+        return parse_product({"all_text": text, "embedded_data": extract_embedded_product(extract_next_data(page))})
+
+    latencies, wall_time = run_concurrently(parse, list(pages.values()), 1)
+    return summarize(latencies, wall_time)
+
+def bench_clean(records, tokenizer, workers, chunk_size):
+    import data_cleaner
+    from boilerplate import BoilerplateStripper
+
+    stripper = BoilerplateStripper.fit([record["all_text"] for record in records[:200]])
+    data_cleaner.set_stage_options(tokenizer, stripper)
+
+    # 청크 하나 처리 지연 (단일 프로세스)
+    chunks = list(data_cleaner.iter_chunks(records, chunk_size))
+    chunk_latencies, _ = run_concurrently(data_cleaner.process_chunk, chunks, 1)
+
+    # 프로세스 풀 전체 처리량
+    start = time.perf_counter()
+    processed = sum(1 for _ in data_cleaner.process_products(records, workers, chunk_size))
+    wall_time = time.perf_counter() - start
+    return {
+        "chunk": summarize(chunk_latencies),
+        "pipeline": {"products": processed, "workers": workers, "total_s": round(wall_time, 4),
+                     "throughput_per_s": round(processed / wall_time, 2) if wall_time > 0 else None},
+    }
+
+class TimedStore:
+    # upsert 호출마다 지연 시간을 기록하는 래퍼
+    def __init__(self, store):
+        self.store = store
+        self.latencies = []
+
+    def upsert(self, vectors):
+        result, latency = timed(self.store.upsert, vectors)
+        self.latencies.append(latency)
+        return result
+
+def bench_upload(records, work_dir, batch_size, index_name=UPLOAD_INDEX, embed_fn=None):
+    from db_pinecone_uploader import upload_batches
+    from ngram_index import NgramIndex
+    from result_cache import publish_index_version
+    from vector_store import open_vector_store
+
+    index = TimedStore(open_vector_store(index_name))
+    embed_latencies = []
+
+    def timed_embed(texts):
+        from db_pinecone_uploader import get_openai_embeddings
+        result, latency = timed(embed_fn or get_openai_embeddings, texts)
+        embed_latencies.append(latency)
+        return result
+
+    name_index = NgramIndex()
+    start = time.perf_counter()
+    uploaded, failed = upload_batches(index, records, batch_size=batch_size,
+                                      checkpoint_path=os.path.join(work_dir, f"{index_name}.checkpoint.jsonl"),
+                                      embed_fn=timed_embed, name_index=name_index)
+    wall_time = time.perf_counter() - start
+    name_index.save(os.environ["NGRAM_INDEX_PATH"])
+    publish_index_version(os.environ["INDEX_VERSION_PATH"], uploaded=uploaded, products=len(name_index))
+    return {
+        "products": uploaded,
+        "failed_batches": failed,
+        "total_s": round(wall_time, 4),
+        "throughput_per_s": round(uploaded / wall_time, 2) if wall_time > 0 else None,
+        "embed_window": summarize(embed_latencies),
+        "upsert_batch": summarize(index.latencies),
+    }
+
+def bench_recipes(process, recipes, concurrency):
+    # 같은 레시피를 두 번 돌려서 캐시가 빈 상태(cold)와 찬 상태(warm)를 따로 잰다
+    results = {}
+    for phase in ("cold", "warm"):
+        latencies, wall_time = run_concurrently(process, recipes, concurrency)
+        results[phase] = summarize(latencies, wall_time)
+    return results
+
+def ingredients_extractor_recipe(recipe_text):
+    import ingredients_extractor
+    ingredients = ingredients_extractor.extract_ingredients(recipe_text)
+    return ingredients_extractor.search_products_in_pinecone(ingredients)
+
+def temp_extractor_recipe(recipe_text):
+    import temp_extractor
+    return temp_extractor.process_recipe(recipe_text)
+
+def configure_environment(base_url, work_dir):
+    # 모든 API 호출은 스텁 서버로, 모든 캐시/색인 파일은 임시 디렉터리로 보낸다
+    os.environ.update({
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY") or "stub",
+        "VECTOR_STORE": "http",
+        "VECTOR_STORE_URL": f"{base_url}/indexes/{{index}}",
+        "EMBEDDING_CACHE_PATH": os.path.join(work_dir, "embedding_cache.db"),
+        "LLM_CACHE_PATH": os.path.join(work_dir, "llm_cache.db"),
+        "NGRAM_INDEX_PATH": os.path.join(work_dir, "product_name_index.json"),
+        "INDEX_VERSION_PATH": os.path.join(work_dir, "index_version.json"),
+    })
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_stage(results, name, func, *args, **kwargs):
+    # 한 단계가 실패해도 (예: 선택 의존성이 없음) 나머지 단계는 계속 잰다
+    print(f"[{name}] 실행 중...")
+    try:
+        results["stages"][name] = func(*args, **kwargs)
+    except Exception as e:
+        print(f"[{name}] 실패: {e}")
+        results["errors"][name] = f"{type(e).__name__}: {e}"
+
+def main():
+    parser = argparse.ArgumentParser(description="스텁 API 서버와 합성 코퍼스로 파이프라인 전체 성능 측정")
+    parser.add_argument("--products", type=int, default=403, help="합성 상품 수")
+    parser.add_argument("--recipes", type=int, default=20, help="레시피 질의 수")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tokenizer", default="approx", help="토큰 계산 방식 (approx, tiktoken[:model], hf:model)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="정제 단계 프로세스 수")
+    parser.add_argument("--chunk-size", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=100, help="업로드 배치 크기")
+    parser.add_argument("--query-concurrency", type=int, default=4)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50)
+    parser.add_argument("--chat-latency-ms", type=float, default=400)
+    parser.add_argument("--index-latency-ms", type=float, default=20)
+    parser.add_argument("--embedding-rpm", type=int, help="임베딩 API 분당 요청 한도 (기본: 무제한)")
+    parser.add_argument("--chat-rpm", type=int)
+    parser.add_argument("--index-rpm", type=int)
+    parser.add_argument("--stages", default="crawl_parse,clean,upload,ingredients_extractor,temp_extractor")
+    parser.add_argument("--output", help="결과 JSON 경로 (기본: benchmarks/results/bench-<시각>.json)")
+    args = parser.parse_args()
+
+    from token_counter import get_token_counter
+
+    stages = set(args.stages.split(","))
+    work_dir = tempfile.mkdtemp(prefix="kurly_bench_")
+    config = StubConfig(args.embedding_latency_ms, args.chat_latency_ms, args.index_latency_ms,
+                        args.embedding_rpm, args.chat_rpm, args.index_rpm, os.path.join(work_dir, "indexes"))
+    server, base_url = start_stub_server(config)
+    configure_environment(base_url, work_dir)
+
+    counter = get_token_counter(args.tokenizer)
+    records, pages = make_corpus(args.products, counter, seed=args.seed)
+    recipes = make_recipes(args.recipes, seed=args.seed)
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+            "corpus": corpus_token_stats(records, counter),
+        },
+        "stages": {},
+        "errors": {},
+    }
+
+    if "crawl_parse" in stages:
+        run_stage(results, "crawl_parse", bench_crawl_parse, pages)
+    if "clean" in stages:
+        run_stage(results, "clean", bench_clean, records, args.tokenizer, args.workers, args.chunk_size)
+
+    from product_parser import with_product_fields
+    upload_records = [with_product_fields(record) for record in records]
+    if "upload" in stages or "ingredients_extractor" in stages:
+        run_stage(results, "upload", bench_upload, upload_records, work_dir, args.batch_size)
+    if "ingredients_extractor" in stages:
+        import ingredients_extractor
+        ingredients_extractor.INDEX_NAME = UPLOAD_INDEX
+        run_stage(results, "ingredients_extractor", bench_recipes, ingredients_extractor_recipe, recipes,
+                  args.query_concurrency)
+    if "temp_extractor" in stages:
+        # 로컬 문장 임베딩 모델(384차원)용 인덱스를 따로 채운 뒤 잰다
+        def temp_extractor_stage():
+            import temp_extractor
+            temp_extractor.INDEX_NAME = LOCAL_ENCODER_INDEX
+            bench_upload(upload_records, work_dir, args.batch_size, LOCAL_ENCODER_INDEX, temp_extractor.get_embeddings)
+            return bench_recipes(temp_extractor_recipe, recipes, args.query_concurrency)
+        run_stage(results, "temp_extractor", temp_extractor_stage)
+
+    results["meta"]["stub_requests"] = dict(config.requests)
+    # 단계 안쪽의 세부 지표 (임베딩 요청, 인덱스 질의, LLM 호출별 시간과 토큰 수)
+    from instrumentation import snapshot
+    results["metrics"] = snapshot()
+    server.shutdown()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"결과 저장: {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import base64
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from synthetic import INGREDIENTS
+from vector_store import LocalStore
+
+MODEL_DIMENSIONS = {"text-embedding-ada-002": 1536, "text-embedding-3-small": 1536, "text-embedding-3-large": 3072}
+
+# 분당 요청 수 제한 (토큰 버킷). 한도를 넘으면 429를 돌려준다.
+class RequestLimiter:
+    def __init__(self, requests_per_minute=None):
+        self.capacity = requests_per_minute
+        self.tokens = float(requests_per_minute or 0)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self):
+        if not self.capacity:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+# 스텁 서버 설정: API별 지연(ms)과 분당 요청 한도
+class StubConfig:
+    def __init__(self, embedding_latency_ms=50, chat_latency_ms=400, index_latency_ms=20,
+                 embedding_rpm=None, chat_rpm=None, index_rpm=None, index_dir=None):
+        self.latency = {"embeddings": embedding_latency_ms, "chat": chat_latency_ms, "index": index_latency_ms}
+        self.limiters = {"embeddings": RequestLimiter(embedding_rpm), "chat": RequestLimiter(chat_rpm),
+                         "index": RequestLimiter(index_rpm)}
+        self.index_dir = index_dir or tempfile.mkdtemp(prefix="stub_index_")
+        self.indexes = {}
+        self.indexes_lock = threading.Lock()
+        self.requests = {"embeddings": 0, "chat": 0, "index": 0, "throttled": 0}
+
+    def index(self, name, dimension=None):
+        with self.indexes_lock:
+            if name not in self.indexes:
+                if dimension is None:
+                    return None
+                self.indexes[name] = LocalStore(os.path.join(self.index_dir, name), dimension=dimension)
+            return self.indexes[name]
+
+def fake_embedding(model, text, dimension):
+    # 같은 텍스트에는 항상 같은 단위 벡터를 돌려준다
+    seed = int.from_bytes(hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+def fake_chat_reply(prompt):
+    # 요청한 JSON 형식에 맞춰 레시피에 나오는 재료나 재료별 추천을 돌려준다
+    if '"recommendations"' in prompt:
+        names = re.findall(r'재료: "([^"]+)"', prompt)
+        return json.dumps({"recommendations": [
+            {"ingredient": name, "recommendation": f"{name}에는 할인율이 높은 첫 번째 상품을 추천합니다."} for name in names
+        ]}, ensure_ascii=False)
+    if '"ingredients"' in prompt:
+        found = [ingredient for ingredient in INGREDIENTS if ingredient in prompt.split("JSON 형식 예시")[0]]
+        if '"description"' in prompt:
+            return json.dumps({"ingredients": [{"name": name, "description": f"{name} 설명"} for name in found]},
+                              ensure_ascii=False)
+        return "```json\n" + json.dumps({"ingredients": found}, ensure_ascii=False) + "\n```"
+    return "가격과 할인율을 고려하면 첫 번째 상품이 가장 적합합니다."
+
+class StubHandler(BaseHTTPRequestHandler):
+    config = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _admit(self, service):
+        config = self.config
+        if not config.limiters[service].allow():
+            config.requests["throttled"] += 1
+            self._send(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error",
+                                       "code": "rate_limit_exceeded"}}, {"Retry-After": "1"})
+            return False
+        config.requests[service] += 1
+        time.sleep(config.latency[service] / 1000)
+        return True
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self._body()
+        if path.endswith("/embeddings"):
+            if self._admit("embeddings"):
+                self._embeddings(body)
+        elif path.endswith("/chat/completions"):
+            if self._admit("chat"):
+                self._chat(body)
+        elif path.startswith("/indexes/"):
+            if self._admit("index"):
+                self._index(path, body)
+        else:
+            self._send(404, {"error": f"unknown path {path}"})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.startswith("/indexes/") and url.path.endswith("/vectors/fetch"):
+            if self._admit("index"):
+                name = url.path.split("/")[2]
+                store = self.config.index(name)
+                ids = parse_qs(url.query).get("ids", [])
+                self._send(200, store.fetch(ids) if store is not None else {"vectors": {}})
+        else:
+            self._send(404, {"error": f"unknown path {url.path}"})
+
+    def _embeddings(self, body):
+        model = body.get("model", "text-embedding-ada-002")
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dimension = MODEL_DIMENSIONS.get(model, 1536)
+        data = []
+        for i, text in enumerate(inputs):
+            vector = fake_embedding(model, str(text), dimension)
+            # openai 클라이언트는 기본으로 base64 인코딩을 요청한다
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        tokens = sum(len(str(text)) for text in inputs)
+        self._send(200, {"object": "list", "data": data, "model": model,
+                         "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    def _chat(self, body):
+        prompt = "\n".join(message.get("content", "") for message in body.get("messages", []))
+        content = fake_chat_reply(prompt)
+        self._send(200, {
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt), "completion_tokens": len(content),
+                      "total_tokens": len(prompt) + len(content)},
+        })
+
+    def _index(self, path, body):
+        parts = path.split("/")
+        name, action = parts[2], "/".join(parts[3:])
+        if action == "vectors/upsert":
+            vectors = body.get("vectors", [])
+            store = self.config.index(name, len(vectors[0]["values"]) if vectors else None)
+            result = store.upsert(vectors) if store is not None else {"upserted_count": 0}
+            self._send(200, {"upsertedCount": result["upserted_count"]})
+        elif action == "query":
+            store = self.config.index(name)
+            if store is None:
+                self._send(200, {"matches": []})
+                return
+            try:
+                result = store.query(body["vector"], top_k=body.get("topK", 10),
+                                     include_metadata=body.get("includeMetadata", False),
+                                     include_values=body.get("includeValues", False), filter=body.get("filter"))
+            except ValueError as e:
+                self._send(400, {"error": str(e)})
+                return
+            self._send(200, result)
+        else:
+            self._send(404, {"error": f"unknown index action {action}"})
+
+def start_stub_server(config=None, host="127.0.0.1", port=0):
+    # 임베딩/채팅(OpenAI 호환)과 벡터 인덱스(Pinecone 데이터 플레인 호환) API를 한 서버에서 흉내 낸다
+    config = config or StubConfig()
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
@@ -0,0 +1,113 @@
+import html
+import json
+import math
+import random
+
+# processed_data_summary.txt 기준 실제 코퍼스: 403개 상품, 평균 1210 토큰, 최소 104, 최대 2942
+TOKEN_MEAN = 1210
+TOKEN_SIGMA = 0.45
+TOKEN_MIN = 104
+TOKEN_MAX = 2942
+
+NAV_LINES = [
+    "회원가입", "로그인", "고객센터", "공지사항", "자주하는 질문", "1:1 문의", "대량주문 문의",
+    "마켓컬리", "뷰티컬리", "카테고리", "신상품", "베스트", "알뜰쇼핑", "특가/혜택", "샛별·하루 배송안내",
+]
+FOOTER_LINES = [
+    "고객행복센터", "1644-1107", "월~토요일 오전 7시 - 오후 6시", "카카오톡 문의", "1:1 문의",
+    "컬리소개", "이용약관", "개인정보처리방침", "이용안내", "© KURLY CORP. ALL RIGHTS RESERVED",
+]
+DELIVERY_TYPES = ["샛별배송", "하루배송", "판매자배송"]
+BRANDS = ["풀무원", "CJ", "오뚜기", "컬리", "청정원", "대상", "샘표", "동원", "해표", "비비고"]
+INGREDIENTS = [
+    "소금", "후추", "마늘", "올리브 오일", "파스타", "두부", "토마토", "방울토마토", "바질", "파마산 치즈",
+    "양파", "대파", "간장", "설탕", "버터", "우유", "달걀", "고추장", "된장", "참기름", "식초", "밀가루",
+]
+PRODUCT_FORMS = ["국산", "유기농", "프리미엄", "무농약", "엑스트라버진", "저염", "냉장", "대용량", "1kg", "500g", "300ml"]
+BODY_WORDS = [
+    "신선한", "재료", "풍미", "요리", "간편하게", "보관", "냉장", "산지", "직송", "엄선한", "맛", "식감",
+    "원재료", "함량", "영양", "정보", "알레르기", "유발", "물질", "함유", "제품", "소비기한", "포장",
+    "상품", "설명", "고객", "후기", "만족", "추천", "가정", "식탁", "건강", "깔끔한", "고소한",
+]
+
+def token_targets(count, rng, mean=TOKEN_MEAN, sigma=TOKEN_SIGMA, low=TOKEN_MIN, high=TOKEN_MAX):
+    # 로그정규분포에서 뽑아 실제 코퍼스와 비슷한 평균/범위가 되게 한다
+    mu = math.log(mean) - sigma ** 2 / 2
+    return [int(min(high, max(low, rng.lognormvariate(mu, sigma)))) for _ in range(count)]
+
+def make_product(product_id, rng):
+    ingredient = rng.choice(INGREDIENTS)
+    brand = rng.choice(BRANDS)
+    original_price = rng.randrange(20, 600) * 100
+    discount_rate = rng.choice([0, 0, 5, 10, 15, 20, 30])
+    return {
+        "id": str(product_id),
+        "url": f"https://www.kurly.com/goods/{product_id}",
+        "category": rng.choice([907, 908, 909, 910, 911, 912]),
+        "name": f"[{brand}] {rng.choice(PRODUCT_FORMS)} {ingredient}",
+        "brand": brand,
+        "original_price": original_price,
+        "discount_rate": discount_rate,
+        "price": original_price * (100 - discount_rate) // 100,
+        "delivery_type": rng.choice(DELIVERY_TYPES),
+    }
+
+def product_text(product, target_tokens, rng, counter):
+    # 내비게이션 → 배송 유형 → 상품명 → 가격 → 본문 → 푸터 순서로 상세 페이지 본문을 만든다
+    head = NAV_LINES + [product["delivery_type"], product["name"], "맛있게 즐기는 간편한 선택"]
+    if product["discount_rate"]:
+        head += [f"{product['discount_rate']}%", f"{product['price']:,}원", f"{product['original_price']:,}원"]
+    else:
+        head += [f"{product['price']:,}원"]
+    lines = head[:]
+    tokens = counter.count("\n".join(head + FOOTER_LINES))
+    while tokens < target_tokens:
+        sentence = " ".join(rng.choice(BODY_WORDS) for _ in range(rng.randrange(6, 16))) + "."
+        lines.append(sentence)
+        tokens += counter.count(sentence)
+    return "\n".join(lines + FOOTER_LINES)
+
+def product_page(product, text):
+    # HttpFetcher가 읽는 형태: 본문 텍스트 + __NEXT_DATA__ 안의 상품 정보
+    next_data = {"props": {"pageProps": {"product": {
+        "name": product["name"], "brandName": product["brand"], "discountedPrice": product["price"],
+        "retailPrice": product["original_price"], "discountRate": product["discount_rate"],
+        "deliveryTypeNames": [product["delivery_type"]],
+    }}}}
+    body = "\n".join(f"<div>{html.escape(line)}</div>" for line in text.split("\n"))
+    return (
+        "<html><head><title>컬리</title><style>.a{color:red}</style></head><body>"
+        f"<nav><a href=\"/goods/{product['id']}\">상품</a></nav>{body}"
+        f"<script>window.dataLayer = [];</script>"
+        f"<script id=\"__NEXT_DATA__\" type=\"application/json\">{json.dumps(next_data, ensure_ascii=False)}</script>"
+        "</body></html>"
+    )
+
+def make_corpus(count, counter, seed=0, start_id=1000000000):
+    # 크롤링 결과(JSONL 레코드)와 같은 상품의 HTML 페이지를 함께 만든다
+    rng = random.Random(seed)
+    records, pages = [], {}
+    for i, target in enumerate(token_targets(count, rng)):
+        product = make_product(start_id + i, rng)
+        text = product_text(product, target, rng, counter)
+        records.append({"id": product["id"], "url": product["url"], "category": product["category"], "all_text": text})
+        pages[product["id"]] = product_page(product, text)
+    return records, pages
+
+def make_recipes(count, seed=0, ingredients_per_recipe=(3, 7)):
+    rng = random.Random(seed)
+    recipes = []
+    for i in range(count):
+        chosen = rng.sample(INGREDIENTS, rng.randint(*ingredients_per_recipe))
+        steps = [f"{n + 1}. {ingredient}을(를) 준비해서 팬에 넣고 볶는다." for n, ingredient in enumerate(chosen)]
+        recipes.append(f"요리 {i + 1} 만들기:\n" + "\n".join(steps))
+    return recipes
+
+def corpus_token_stats(records, counter):
+    counts = sorted(counter.count(record["all_text"]) for record in records)
+    return {
+        "products": len(counts),
+        "mean_tokens": round(sum(counts) / len(counts), 2) if counts else 0,
+        "min_tokens": counts[0] if counts else 0,
+        "max_tokens": counts[-1] if counts else 0,
+    }
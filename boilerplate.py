@@ -0,0 +1,88 @@
+import json
+
+def _longest_shared_prefix(texts, min_count):
+    # 정렬하면 같은 접두사를 가진 문서들은 연속해서 놓이므로,
+    # min_count개 창의 처음과 끝 문서의 공통 접두사 중 가장 긴 것이 답이다
+    if min_count < 2 or len(texts) < min_count:
+        return ""
+    ordered = sorted(texts)
+    best = ""
+    for i in range(len(ordered) - min_count + 1):
+        first, last = ordered[i], ordered[i + min_count - 1]
+        length = 0
+        limit = min(len(first), len(last))
+        while length < limit and first[length] == last[length]:
+            length += 1
+        if length > len(best):
+            best = first[:length]
+    return best
+
+# 사이트 공통 머리말/꼬리말(내비게이션, 푸터 등)과 대부분의 문서에 반복되는 줄을
+# 코퍼스 샘플에서 학습해서 제거한다.
+class BoilerplateStripper:
+    def __init__(self, prefix="", suffix="", lines=()):
+        self.prefix = prefix
+        self.suffix = suffix
+        self.lines = set(lines)
+
+    @classmethod
+    def fit(cls, texts, min_doc_fraction=0.6, min_block_chars=20, line_doc_fraction=0.8, min_line_chars=2):
+        texts = [text for text in texts if text]
+        min_count = max(2, int(len(texts) * min_doc_fraction))
+
+        prefix = _longest_shared_prefix(texts, min_count)
+        suffix = _longest_shared_prefix([text[::-1] for text in texts], min_count)[::-1]
+        # 줄바꿈이 있으면 줄 경계에 맞춰서 본문 일부(예: 가격 끝자리)가 딸려 나가지 않게 한다
+        if "\n" in prefix:
+            prefix = prefix[:prefix.rfind("\n") + 1]
+        if "\n" in suffix:
+            suffix = suffix[suffix.find("\n"):]
+
+        line_counts = {}
+        for text in texts:
+            for line in set(line.strip() for line in text.splitlines()):
+                if len(line) >= min_line_chars:
+                    line_counts[line] = line_counts.get(line, 0) + 1
+        min_line_count = max(2, int(len(texts) * line_doc_fraction))
+        lines = [line for line, count in line_counts.items() if count >= min_line_count]
+
+        return cls(
+            prefix if len(prefix) >= min_block_chars else "",
+            suffix if len(suffix) >= min_block_chars else "",
+            lines,
+        )
+
+    def strip_with_report(self, text):
+        # 제거한 조각도 함께 돌려준다 (토큰 절감량 계산용)
+        removed = []
+        if self.prefix and text.startswith(self.prefix):
+            text = text[len(self.prefix):]
+            removed.append(self.prefix)
+        if self.suffix and text.endswith(self.suffix):
+            text = text[:-len(self.suffix)]
+            removed.append(self.suffix)
+        if self.lines:
+            kept = []
+            for line in text.splitlines():
+                if line.strip() in self.lines:
+                    removed.append(line.strip())
+                else:
+                    kept.append(line)
+            text = "\n".join(kept)
+        return text, removed
+
+    def strip(self, text):
+        return self.strip_with_report(text)[0]
+
+    def to_dict(self):
+        return {"prefix": self.prefix, "suffix": self.suffix, "lines": sorted(self.lines)}
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data.get("prefix", ""), data.get("suffix", ""), data.get("lines", []))
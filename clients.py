@@ -0,0 +1,35 @@
+import os
+import threading
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+@lru_cache(maxsize=None)
+def get_openai_client():
+    # 하나의 클라이언트(연결 풀)를 프로세스 전체에서 재사용한다.
+    # OPENAI_BASE_URL을 지정하면 로컬 스텁 서버 등으로 요청을 보낼 수 있다.
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL") or None)
+
+_init_lock = threading.Lock()
+
+@lru_cache(maxsize=None)
+def _open_vector_store(index_name):
+    from vector_store import open_vector_store
+    return open_vector_store(index_name)
+
+@lru_cache(maxsize=None)
+def _load_sentence_model(model_name):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+def get_vector_store(index_name):
+    # 무거운 초기화는 동시에 처음 호출돼도 한 번만 일어나게 잠금 안에서 만든다
+    with _init_lock:
+        return _open_vector_store(index_name)
+
+def get_sentence_model(model_name):
+    with _init_lock:
+        return _load_sentence_model(model_name)
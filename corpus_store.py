@@ -0,0 +1,421 @@
+import fcntl
+import glob
+import json
+import mmap
+import os
+import socket
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
+
+from jsonl_store import JsonArrayWriter, JsonlWriter, iter_json_records, iter_jsonl, load_completed_ids, repair_tail
+
+# 블록 단위로 열마다 따로 압축한 코퍼스 파일 (크롤링 결과, 정제 결과 공용).
+#
+#   crawled_data.corpus             열 조각(column segment)을 이어 붙인 데이터 파일 (추가만 함)
+#   crawled_data.corpus.blocks      블록 목록 (JSONL, 한 줄에 블록 하나: 열별 오프셋/길이/코덱, 추가만 함)
+#   crawled_data.corpus.ids         상품 ID → (블록, 행) 고정 폭 바이너리 레코드 (추가만 함, 읽을 때 mmap)
+#   crawled_data.corpus.lock        블록을 추가할 때 잡는 잠금 파일
+#   crawled_data.corpus.journal-*   아직 블록으로 묶이지 않은 레코드 (writer마다 하나)
+#
+# 열을 따로 압축하므로 id와 token_count만 읽는 통계는 본문 열을 풀지 않는다.
+# 블록을 추가할 때 세 파일 모두 끝에 덧붙이기만 하므로 블록 수가 늘어도 추가 비용은 일정하다.
+# 데이터 → ID 레코드 → 블록 줄 순서로 쓰고, 블록 줄이 커밋 지점이다. 읽는 쪽은 블록 줄에 적힌
+# ids_end까지의 ID 레코드만 보므로 언제나 완성된 블록만 본다. 값이 None인 필드는 저장하지 않는다.
+
+CORPUS_SUFFIX = ".corpus"
+FORMAT_VERSION = 2
+BLOCK_SIZE = 256
+ZSTD_LEVEL = 3
+# ID 레코드: UTF-8 ID (0으로 채움), 블록 번호, 행 번호
+ID_BYTES = 32
+ID_RECORD = struct.Struct(f"<{ID_BYTES}sII")
+
+@lru_cache(maxsize=None)
+def _zstd():
+    # zstandard가 없으면 zlib으로 압축한다 (블록마다 코덱을 기록하므로 섞여 있어도 읽을 수 있다)
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+def default_codec():
+    return "zstd" if _zstd() is not None else "zlib"
+
+def compress(data, codec):
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, 6)
+
+def decompress(data, codec):
+    if codec == "zstd":
+        if _zstd() is None:
+            raise RuntimeError("zstd로 압축된 블록을 읽으려면 zstandard 패키지가 필요합니다.")
+        return _zstd().ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+def is_corpus(path):
+    return path.endswith(CORPUS_SUFFIX)
+
+def blocks_path(path):
+    return path + ".blocks"
+
+def ids_path(path):
+    return path + ".ids"
+
+def read_blocks(path):
+    if not os.path.exists(blocks_path(path)):
+        return []
+    # 쓰는 도중 잘린 마지막 줄은 iter_jsonl이 건너뛴다 (아직 커밋되지 않은 블록)
+    return list(iter_jsonl(blocks_path(path)))
+
+def _last_block(path):
+    # 블록 목록 전체를 읽지 않고 마지막 줄만 읽는다
+    try:
+        with open(blocks_path(path), 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            tail = b""
+            while pos > 0 and tail.count(b"\n") < 2:
+                step = min(4096, pos)
+                pos -= step
+                f.seek(pos)
+                tail = f.read(step) + tail
+    except FileNotFoundError:
+        return None
+    # 마지막 개행 뒤는 아직 쓰는 중인 줄이다
+    lines = tail.split(b"\n")[:-1]
+    return json.loads(lines[-1]) if lines and lines[-1] else None
+
+def _encode_id(product_id):
+    encoded = str(product_id).encode("utf-8")
+    if len(encoded) > ID_BYTES:
+        raise ValueError(f"상품 ID가 {ID_BYTES}바이트보다 깁니다: {product_id}")
+    return encoded
+
+@contextmanager
+def _store_lock(path):
+    # 여러 프로세스(큐 워커)가 같은 코퍼스에 블록을 추가할 수 있으므로 블록 추가를 직렬화한다
+    with open(path + ".lock", 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def _encode_block(records, codec):
+    columns = {}
+    for row, record in enumerate(records):
+        for key, value in record.items():
+            if value is None:
+                continue
+            if key not in columns:
+                columns[key] = [None] * len(records)
+            columns[key][row] = value
+    return [(name, compress(json.dumps(values, ensure_ascii=False).encode("utf-8"), codec))
+            for name, values in columns.items()]
+
+def append_block(path, records, codec=None, durable=True):
+    if not records:
+        return
+    codec = codec or default_codec()
+    segments = _encode_block(records, codec)
+    ids = [(_encode_id(record["id"]), row) for row, record in enumerate(records) if record.get("id") is not None]
+    with _store_lock(path):
+        # 블록 줄을 쓰기 전에 죽은 writer가 남긴 잘린 줄과 커밋되지 않은 ID 레코드를 먼저 잘라낸다.
+        # 데이터 파일 끝의 쓰레기는 어떤 블록도 가리키지 않으므로 그대로 둔다.
+        repair_tail(blocks_path(path))
+        last = _last_block(path)
+        block_no = last["block"] + 1 if last else 0
+        ids_end = last["ids_end"] if last else 0
+        with open(path, 'ab') as f:
+            offset = f.tell()
+            columns = {}
+            for name, data in segments:
+                f.write(data)
+                columns[name] = [offset, len(data)]
+                offset += len(data)
+            f.flush()
+            if durable:
+                os.fsync(f.fileno())
+        # 같은 ID가 다시 들어오면 (증분 크롤링) 뒤에 있는 레코드가 이긴다
+        with open(ids_path(path), 'ab') as f:
+            f.truncate(ids_end * ID_RECORD.size)
+            f.write(b"".join(ID_RECORD.pack(product_id, block_no, row) for product_id, row in ids))
+            f.flush()
+            if durable:
+                os.fsync(f.fileno())
+        block = {"block": block_no, "count": len(records), "codec": codec, "columns": columns,
+                 "ids_end": ids_end + len(ids)}
+        with open(blocks_path(path), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(block, ensure_ascii=False, separators=(",", ":")) + "\n")
+            f.flush()
+            if durable:
+                os.fsync(f.fileno())
+
+def remove_corpus(path):
+    with _store_lock(path):
+        for file_path in [path, blocks_path(path), ids_path(path)] + glob.glob(glob.escape(path) + ".journal-*"):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+def recover_journals(path, block_size=BLOCK_SIZE):
+    # 비정상 종료한 writer의 저널을 블록으로 옮긴다. 살아 있는 writer는 자기 저널을 잠그고 있으므로 건너뛴다.
+    recovered = 0
+    for journal_path in glob.glob(glob.escape(path) + ".journal-*"):
+        try:
+            fd = os.open(journal_path, os.O_RDWR)
+        except FileNotFoundError:
+            continue
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            # 다른 프로세스가 먼저 복구해서 지운 파일이면 건너뛴다
+            if os.fstat(fd).st_nlink == 0:
+                continue
+            records = list(iter_jsonl(journal_path))
+            for start in range(0, len(records), block_size):
+                append_block(path, records[start:start + block_size])
+            recovered += len(records)
+            os.remove(journal_path)
+        finally:
+            os.close(fd)
+    return recovered
+
+class CorpusWriter:
+    # 레코드를 block_size개씩 모아 블록으로 쓴다.
+    # durable=True면 블록이 차기 전의 레코드도 저널(JSONL)에 바로 fsync해서 크래시가 나도 잃지 않는다.
+    # 블록을 쓴 직후 저널을 비우기 전에 죽으면 그 레코드는 복구 때 한 번 더 들어간다 (ID는 마지막 것을 가리킴).
+    def __init__(self, path, block_size=BLOCK_SIZE, truncate=False, durable=True, codec=None):
+        self.path = path
+        self.block_size = block_size
+        self.durable = durable
+        self.codec = codec
+        self._pending = []
+        self._lock = threading.Lock()
+        self._journal = None
+        self._owner = None
+        if truncate:
+            remove_corpus(path)
+        else:
+            recover_journals(path, block_size)
+        if durable:
+            self._journal_path = f"{path}.journal-{socket.gethostname()}-{os.getpid()}-{id(self):x}"
+            self._journal = JsonlWriter(self._journal_path, truncate=True)
+            # 저널을 잠가두면 다른 프로세스가 살아 있는 writer의 저널을 복구하지 않는다
+            self._owner = open(self._journal_path, 'a')
+            fcntl.flock(self._owner.fileno(), fcntl.LOCK_EX)
+
+    def write(self, record):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.write(record)
+            self._pending.append(record)
+            if len(self._pending) >= self.block_size:
+                self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        append_block(self.path, self._pending, self.codec, self.durable)
+        self._pending = []
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = JsonlWriter(self._journal_path, truncate=True)
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            if self._journal is None and self._owner is None and not self._pending:
+                return
+            self._flush()
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+                os.remove(self._journal_path)
+            if self._owner is not None:
+                self._owner.close()
+                self._owner = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class CorpusReader:
+    # 데이터 파일과 ID 파일은 mmap으로 열고, 요청한 열의 조각만 풀어서 읽는다.
+    # 연 시점까지 커밋된 블록만 보며, ID → (블록, 행) 표는 처음 ID로 찾을 때 한 번 만든다.
+    # ID로 찾은 블록은 최근 몇 개를 풀어둔 채로 캐시한다.
+    def __init__(self, path, cache_blocks=4):
+        self.path = path
+        self.blocks = read_blocks(path)
+        self._ids_end = self.blocks[-1]["ids_end"] if self.blocks else 0
+        self._id_map = None
+        self._file = None
+        self._mmap = None
+        self._cache = OrderedDict()
+        self._cache_blocks = cache_blocks
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(block["count"] for block in self.blocks)
+
+    def __contains__(self, product_id):
+        return str(product_id) in self._locations()
+
+    def ids(self):
+        return list(self._locations())
+
+    def columns(self):
+        names = {}
+        for block in self.blocks:
+            names.update(dict.fromkeys(block["columns"]))
+        return list(names)
+
+    def _locations(self):
+        if self._id_map is None:
+            self._id_map = dict(iter_id_records(self.path, self._ids_end))
+        return self._id_map
+
+    def _data(self):
+        if self._mmap is None:
+            self._file = open(self.path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def _read_block(self, block_no, columns=None):
+        block = self.blocks[block_no]
+        data = self._data()
+        values = {}
+        for name, (offset, length) in block["columns"].items():
+            if columns is None or name in columns:
+                values[name] = json.loads(decompress(data[offset:offset + length], block["codec"]))
+        return values
+
+    def _cached_block(self, block_no, columns):
+        key = (block_no, tuple(columns) if columns is not None else None)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        values = self._read_block(block_no, columns)
+        with self._lock:
+            self._cache[key] = values
+            while len(self._cache) > self._cache_blocks:
+                self._cache.popitem(last=False)
+        return values
+
+    def get(self, product_id, columns=None):
+        location = self._locations().get(str(product_id))
+        if location is None:
+            return None
+        block_no, row = location
+        values = self._cached_block(block_no, columns)
+        return {name: column[row] for name, column in values.items() if column[row] is not None}
+
+    def iter_records(self, columns=None, latest_only=False):
+        # latest_only면 같은 ID가 여러 번 들어 있을 때 (증분 크롤링) 마지막 레코드만 돌려준다
+        ids = self._locations() if latest_only else None
+        read_columns = columns
+        if latest_only and columns is not None and "id" not in columns:
+            read_columns = tuple(columns) + ("id",)
+        for block_no, block in enumerate(self.blocks):
+            values = self._read_block(block_no, read_columns)
+            id_column = values.get("id") if latest_only else None
+            if read_columns is not columns:
+                values.pop("id", None)
+            for row in range(block["count"]):
+                if id_column is not None and id_column[row] is not None \
+                        and ids.get(str(id_column[row])) != (block_no, row):
+                    continue
+                yield {name: column[row] for name, column in values.items() if column[row] is not None}
+
+    def __iter__(self):
+        return self.iter_records()
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def iter_id_records(path, ids_end=None):
+    # ID 파일을 mmap해서 (ID, (블록, 행))을 쓴 순서대로 돌려준다. ids_end 뒤는 커밋되지 않은 레코드다.
+    if ids_end is None:
+        last = _last_block(path)
+        ids_end = last["ids_end"] if last else 0
+    if ids_end == 0:
+        return
+    with open(ids_path(path), 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        view = memoryview(data)[:ids_end * ID_RECORD.size]
+        try:
+            for product_id, block_no, row in ID_RECORD.iter_unpack(view):
+                yield product_id.rstrip(b"\0").decode("utf-8"), (block_no, row)
+        finally:
+            view.release()
+
+def iter_records(path, columns=None, latest_only=False):
+    # 코퍼스, JSON 배열, JSONL 파일을 모두 레코드 스트림으로 읽는다 (columns를 주면 그 필드만)
+    if is_corpus(path):
+        with CorpusReader(path) as reader:
+            yield from reader.iter_records(columns, latest_only)
+        return
+    last_seen = {}
+    if latest_only:
+        # JSON 파일은 ID별 마지막 위치를 먼저 한 번 훑어서 찾는다
+        for position, record in enumerate(iter_json_records(path)):
+            if record.get('id') is not None:
+                last_seen[str(record['id'])] = position
+    for position, record in enumerate(iter_json_records(path)):
+        if last_seen and record.get('id') is not None and last_seen[str(record['id'])] != position:
+            continue
+        yield record if columns is None else {key: record[key] for key in columns if key in record}
+
+def _iter_ids(path):
+    # 쓴 순서대로 상품 ID를 돌려준다 (같은 ID가 여러 번 나올 수 있음)
+    if is_corpus(path):
+        for product_id, _ in iter_id_records(path):
+            yield product_id
+    elif os.path.exists(path):
+        for record in iter_jsonl(path):
+            if 'id' in record:
+                yield str(record['id'])
+
+def count_ids(path):
+    # 지금까지 쓴 ID 수. 이어 쓰는 출력에서 이번 실행이 어디서부터 시작했는지 표시하는 데 쓴다
+    if is_corpus(path):
+        last = _last_block(path)
+        return last["ids_end"] if last else 0
+    return sum(1 for _ in _iter_ids(path))
+
+def load_ids(path, start=0):
+    # 출력 파일 자체가 상품 단위 체크포인트 역할을 한다 (start를 주면 그 위치 뒤에 쓴 ID만)
+    if start == 0 and not is_corpus(path):
+        return load_completed_ids(path)
+    return set(islice(_iter_ids(path), start, None))
+
+def open_record_writer(path, truncate=True, durable=False, shared=False):
+    if is_corpus(path):
+        return CorpusWriter(path, truncate=truncate, durable=durable)
+    if path.endswith('.json'):
+        # 기존 도구와의 호환용 (이어 쓰기는 지원하지 않음)
+        return JsonArrayWriter(path)
+    return JsonlWriter(path, durable=durable, truncate=truncate, shared=shared)
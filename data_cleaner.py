@@ -1,12 +1,23 @@
-import json
+import os
 import re
-import nltk
+import time
+import argparse
+from collections import deque
+from itertools import islice, chain
+from multiprocessing import Pool, cpu_count
 from tqdm import tqdm
-from io import StringIO
-import sys
+from corpus_store import CorpusReader, is_corpus, iter_records, open_record_writer
+from token_counter import get_token_counter, EMBEDDING_TOKEN_LIMIT
+from boilerplate import BoilerplateStripper
+from product_parser import PRODUCT_FIELDS, with_product_fields
+from instrumentation import count, dump_metrics, observe
 
-nltk.download('punkt', quiet=True)
-from nltk.tokenize import word_tokenize
+INPUT_PATH = 'crawled_data.corpus'
+OUTPUT_PATH = 'processed_data.corpus'
+SUMMARY_PATH = 'processed_data_summary.txt'
+TOKEN_LIMIT = EMBEDDING_TOKEN_LIMIT
+DEFAULT_TOKENIZER = 'tiktoken'
+BOILERPLATE_SAMPLE_SIZE = 200
 
 def clean_text(text):
     # HTML 태그 제거
@@ -15,87 +26,263 @@ def clean_text(text):
     text = re.sub(r'[^\w\s가-힣]', '', text)
     return text
 
+# 임베딩 모델 기준 토큰 수를 센다. 워커 프로세스에서는 풀 initializer가 설정한다.
+_tokenizer_spec = DEFAULT_TOKENIZER
+_stripper = None
+_removed_token_cache = {}
+
+def set_tokenizer(spec):
+    global _tokenizer_spec
+    _tokenizer_spec = spec
+
+def set_stage_options(tokenizer_spec, stripper):
+    global _stripper
+    set_tokenizer(tokenizer_spec)
+    _stripper = stripper
+    _removed_token_cache.clear()
+
+def removed_tokens(pieces):
+    # 머리말/꼬리말과 반복 줄은 모든 상품에서 같으므로 조각별 토큰 수를 한 번만 센다
+    total = 0
+    for piece in pieces:
+        if piece not in _removed_token_cache:
+            _removed_token_cache[piece] = count_tokens(clean_text(piece))
+        total += _removed_token_cache[piece]
+    return total
+
 def count_tokens(text):
-    return len(word_tokenize(text))
+    return get_token_counter(_tokenizer_spec).count(text)
 
-def process_product(product_data):
+def process_product(product_data, token_count=None):
     product_id = product_data.get('id', 'Unknown')
     product_url = product_data.get('url', '')
     product_text = product_data.get('all_text', '')
     cleaned_text = clean_text(product_text)
-    token_count = count_tokens(cleaned_text)
-    return {
+    if token_count is None:
+        token_count = count_tokens(cleaned_text)
+    processed = {
         'id': product_id,
         'url': product_url,
         'token_count': token_count,
-        'cleaned_text': cleaned_text,  # 전체 정제된 텍스트 저장
-        'text_preview': cleaned_text[:100]  # 미리보기용 (처음 100자)
+        'cleaned_text': cleaned_text  # 전체 정제된 텍스트 저장
     }
+    # 크롤링 단계에서 파싱한 구조화 필드(상품명, 가격 등)와 카테고리는 그대로 넘긴다
+    for field in ('category',) + PRODUCT_FIELDS:
+        if product_data.get(field) is not None:
+            processed[field] = product_data[field]
+    return processed
+
+def strip_boilerplate(chunk):
+    # 사이트 공통 텍스트를 정제 전에 제거하고, 제거한 만큼의 토큰 수를 기록해둔다
+    stripped_chunk = []
+    saved_tokens = []
+    for product in chunk:
+        text, removed = _stripper.strip_with_report(product.get('all_text', ''))
+        stripped_chunk.append(dict(product, all_text=text))
+        saved_tokens.append(removed_tokens(removed))
+    return stripped_chunk, saved_tokens
+
+def process_chunk(chunk):
+    saved_tokens = None
+    # 예전 크롤링 결과처럼 구조화 필드가 없으면 원문이 남아 있는 지금 파싱한다
+    chunk = [with_product_fields(product) for product in chunk]
+    if _stripper is not None:
+        chunk, saved_tokens = strip_boilerplate(chunk)
+
+    # 청크 단위로 한 번에 토큰 수를 센다
+    cleaned_texts = [clean_text(product.get('all_text', '')) for product in chunk]
+    token_counts = get_token_counter(_tokenizer_spec).count_batch(cleaned_texts)
+    processed = [process_product(product, token_count) for product, token_count in zip(chunk, token_counts)]
+    if saved_tokens is not None:
+        for product, saved in zip(processed, saved_tokens):
+            product['boilerplate_tokens'] = saved
+    return processed
+
+def timed_chunk(chunk):
+    # 워커 프로세스의 지표는 부모로 넘어오지 않으므로 처리 시간을 결과와 함께 돌려준다
+    start = time.perf_counter()
+    processed = process_chunk(chunk)
+    return processed, time.perf_counter() - start
+
+def record_chunk(result):
+    processed, elapsed = result
+    observe("clean_chunk", elapsed)
+    count("clean_products_total", len(processed))
+    count("clean_tokens_total", sum(product['token_count'] for product in processed))
+    count("boilerplate_tokens_removed_total", sum(product.get('boilerplate_tokens', 0) for product in processed))
+    return processed
+
+def iter_chunks(records, chunk_size):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def process_products(records, workers=1, chunk_size=32):
+    # 입력을 청크 단위로 프로세스 풀에 보내고 결과는 입력 순서대로 돌려준다.
+    # 동시에 처리 중인 청크 수를 제한해서 입력 전체가 메모리에 올라오지 않게 한다.
+    if workers <= 1:
+        for chunk in iter_chunks(records, chunk_size):
+            yield from record_chunk(timed_chunk(chunk))
+        return
+
+    with Pool(workers, initializer=set_stage_options, initargs=(_tokenizer_spec, _stripper)) as pool:
+        pending = deque()
+        for chunk in iter_chunks(records, chunk_size):
+            pending.append(pool.apply_async(timed_chunk, (chunk,)))
+            if len(pending) >= workers * 2:
+                yield from record_chunk(pending.popleft().get())
+        while pending:
+            yield from record_chunk(pending.popleft().get())
+
+# 처리 결과를 모두 들고 있지 않고 통계만 누적한다
+class SummaryStats:
+    token_ranges = [(0, 1000), (1001, 2000), (2001, 4000), (4001, TOKEN_LIMIT), (TOKEN_LIMIT + 1, float('inf'))]
+
+    def __init__(self, sample_size=5, over_limit_examples=3):
+        self.total_products = 0
+        self.total_tokens = 0
+        self.min_tokens = None
+        self.max_tokens = None
+        self.samples = []
+        self.sample_size = sample_size
+        self.over_limit_count = 0
+        self.over_limit_examples = []
+        self.max_over_limit_examples = over_limit_examples
+        self.range_counts = {f"{start}-{end}": 0 for start, end in self.token_ranges}
+        self.boilerplate_tokens = None
+
+    def add(self, product):
+        token_count = product['token_count']
+        if 'boilerplate_tokens' in product:
+            self.boilerplate_tokens = (self.boilerplate_tokens or 0) + product['boilerplate_tokens']
+        self.total_products += 1
+        self.total_tokens += token_count
+        self.min_tokens = token_count if self.min_tokens is None else min(self.min_tokens, token_count)
+        self.max_tokens = token_count if self.max_tokens is None else max(self.max_tokens, token_count)
+        if len(self.samples) < self.sample_size:
+            self.samples.append(product)
+        if token_count > TOKEN_LIMIT:
+            self.over_limit_count += 1
+            if len(self.over_limit_examples) < self.max_over_limit_examples:
+                self.over_limit_examples.append(product)
+        for start, end in self.token_ranges:
+            if start <= token_count <= end:
+                self.range_counts[f"{start}-{end}"] += 1
+
+    def report(self):
+        avg_tokens = self.total_tokens / self.total_products if self.total_products > 0 else 0
+        lines = [
+            f"총 상품 수: {self.total_products}",
+            f"총 토큰 수: {self.total_tokens}",
+            f"평균 토큰 수: {avg_tokens:.2f}",
+            f"최소 토큰 수: {self.min_tokens}",
+            f"최대 토큰 수: {self.max_tokens}",
+            "\n샘플 상품 정보:",
+        ]
+        for product in self.samples:
+            lines += [
+                f"ID: {product['id']}",
+                f"URL: {product['url']}",
+                f"토큰 수: {product['token_count']}",
+                f"텍스트 미리보기: {product.get('cleaned_text', '')[:100]}...",
+                "",
+            ]
+
+        lines.append(f"\n토큰 수가 {TOKEN_LIMIT}를 초과하는 상품 수: {self.over_limit_count}")
+        if self.over_limit_examples:
+            lines.append("초과 상품 예시:")
+            for product in self.over_limit_examples:
+                lines.append(f"ID: {product['id']}, URL: {product['url']}, 토큰 수: {product['token_count']}")
+
+        lines.append("\n토큰 수 구간별 상품 수:")
+        for range_name, count in self.range_counts.items():
+            lines.append(f"{range_name} 토큰: {count}개 상품")
+
+        if self.boilerplate_tokens is not None:
+            saved_avg = self.boilerplate_tokens / self.total_products if self.total_products > 0 else 0
+            before = self.total_tokens + self.boilerplate_tokens
+            saved_ratio = self.boilerplate_tokens / before * 100 if before > 0 else 0
+            lines.append(f"\n공통 텍스트 제거로 절약한 토큰 수: {self.boilerplate_tokens} "
+                         f"(상품당 평균 {saved_avg:.2f}, {saved_ratio:.1f}%)")
+        return "\n".join(lines) + "\n"
+
+def load_or_fit_stripper(records, sample_size, model_path=None):
+    # 저장된 템플릿이 있으면 그대로 쓰고, 없으면 입력 앞부분을 샘플로 학습한다.
+    # 샘플로 읽은 레코드는 다시 스트림 앞에 붙여서 돌려준다.
+    if model_path and os.path.exists(model_path):
+        return BoilerplateStripper.load(model_path), records
+    records = iter(records)
+    sample = list(islice(records, sample_size))
+    stripper = BoilerplateStripper.fit([product.get('all_text', '') for product in sample])
+    if model_path:
+        stripper.save(model_path)
+    return stripper, chain(sample, records)
+
+def run_pipeline(input_path=INPUT_PATH, output_path=OUTPUT_PATH, summary_path=SUMMARY_PATH, workers=1, chunk_size=32,
+                 tokenizer=DEFAULT_TOKENIZER, boilerplate_sample=BOILERPLATE_SAMPLE_SIZE, boilerplate_model=None):
+    # 증분 크롤링 결과에는 같은 상품이 여러 번 들어 있을 수 있으므로 상품마다 마지막 레코드만 정제한다
+    records = iter_records(input_path, latest_only=True)
+    stripper = None
+    if boilerplate_sample > 0 or boilerplate_model:
+        stripper, records = load_or_fit_stripper(records, boilerplate_sample, boilerplate_model)
+    set_stage_options(tokenizer, stripper)
+
+    stats = SummaryStats()
+    with open_record_writer(output_path) as writer:
+        products = process_products(records, workers, chunk_size)
+        for product in tqdm(products, desc="Processing products"):
+            writer.write(product)
+            stats.add(product)
+
+    summary = stats.report()
+    if summary_path:
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write(summary)
+    # METRICS_PATH를 지정하면 청크 처리 시간과 토큰 수 집계를 남긴다
+    dump_metrics()
+    return stats
+
+# 통계에 필요한 열만 읽는다 (본문 열은 샘플 상품만 ID로 찾아서 읽음)
+SUMMARY_COLUMNS = ('id', 'url', 'token_count', 'boilerplate_tokens')
+
+def summarize_corpus(path=OUTPUT_PATH, summary_path=SUMMARY_PATH):
+    # 이미 정제해 둔 결과로 요약 통계만 다시 만든다
+    stats = SummaryStats()
+    for product in iter_records(path, SUMMARY_COLUMNS):
+        stats.add(product)
+    if is_corpus(path):
+        with CorpusReader(path) as reader:
+            for product in stats.samples:
+                product.update(reader.get(product['id'], ('cleaned_text',)) or {})
+    summary = stats.report()
+    if summary_path:
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write(summary)
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="크롤링한 상품 텍스트를 정제하고 토큰 수를 계산합니다.")
+    parser.add_argument("--input", default=INPUT_PATH, help="코퍼스(.corpus), JSON 배열 또는 JSONL 입력 파일")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="결과 파일 (.corpus, .jsonl 또는 .json)")
+    parser.add_argument("--summary", default=SUMMARY_PATH, help="요약 통계 파일")
+    parser.add_argument("--workers", type=int, default=cpu_count(), help="정제/토큰 계산에 사용할 프로세스 수")
+    parser.add_argument("--chunk-size", type=int, default=32, help="한 번에 워커로 보낼 상품 수")
+    parser.add_argument("--tokenizer", default=DEFAULT_TOKENIZER,
+                        help="tiktoken[:모델], hf:<모델>, approx (빠른 근사 통계)")
+    parser.add_argument("--boilerplate-sample", type=int, default=BOILERPLATE_SAMPLE_SIZE,
+                        help="공통 텍스트 학습에 쓸 상품 수 (0이면 제거하지 않음)")
+    parser.add_argument("--boilerplate-model", help="공통 텍스트 템플릿 파일 (있으면 불러오고, 없으면 학습 후 저장)")
+    parser.add_argument("--summary-only", action="store_true", help="정제하지 않고 --output 파일로 요약 통계만 다시 생성")
+    args = parser.parse_args()
+
+    if args.summary_only:
+        summarize_corpus(args.output, args.summary)
+        print(f"{args.summary} 파일이 생성되었습니다.")
+        raise SystemExit(0)
 
-# 출력을 캡처하기 위해 StringIO 객체를 사용합니다.
-old_stdout = sys.stdout
-result = StringIO()
-sys.stdout = result
-
-# JSON 파일 읽기
-with open('crawled_data.json', 'r', encoding='utf-8') as file:
-    data = json.load(file)
-
-# 모든 상품 처리
-processed_products = []
-for product in tqdm(data, desc="Processing products"):
-    processed_products.append(process_product(product))
-
-# 결과 분석
-total_products = len(processed_products)
-total_tokens = sum(p['token_count'] for p in processed_products)
-avg_tokens = total_tokens / total_products if total_products > 0 else 0
-
-print(f"총 상품 수: {total_products}")
-print(f"총 토큰 수: {total_tokens}")
-print(f"평균 토큰 수: {avg_tokens:.2f}")
-
-# 토큰 수 분포
-token_counts = [p['token_count'] for p in processed_products]
-print(f"최소 토큰 수: {min(token_counts)}")
-print(f"최대 토큰 수: {max(token_counts)}")
-
-# 샘플 출력 (처음 5개 상품)
-print("\n샘플 상품 정보:")
-for product in processed_products[:5]:
-    print(f"ID: {product['id']}")
-    print(f"URL: {product['url']}")
-    print(f"토큰 수: {product['token_count']}")
-    print(f"텍스트 미리보기: {product['text_preview']}...")
-    print()
-
-# 토큰 수가 8192를 초과하는 상품 확인
-over_limit_products = [p for p in processed_products if p['token_count'] > 8192]
-print(f"\n토큰 수가 8192를 초과하는 상품 수: {len(over_limit_products)}")
-if over_limit_products:
-    print("초과 상품 예시:")
-    for product in over_limit_products[:3]:  # 처음 3개만 출력
-        print(f"ID: {product['id']}, URL: {product['url']}, 토큰 수: {product['token_count']}")
-
-# 토큰 수 구간별 상품 수 계산
-token_ranges = [(0, 1000), (1001, 2000), (2001, 4000), (4001, 8192), (8193, float('inf'))]
-range_counts = {f"{start}-{end}": sum(start <= p['token_count'] <= end for p in processed_products) 
-                for start, end in token_ranges}
-
-print("\n토큰 수 구간별 상품 수:")
-for range_name, count in range_counts.items():
-    print(f"{range_name} 토큰: {count}개 상품")
-
-# 출력 캡처 종료
-sys.stdout = old_stdout
-summary = result.getvalue()
-
-# summary.txt 파일 저장
-with open('processed_data_summary.txt', 'w', encoding='utf-8') as f:
-    f.write(summary)
-
-# processed_data.json 파일 저장
-with open('processed_data.json', 'w', encoding='utf-8') as f:
-    json.dump(processed_products, f, ensure_ascii=False, indent=2)
-
-print("summary.txt와 processed_data.json 파일이 생성되었습니다.")
\ No newline at end of file
+    run_pipeline(args.input, args.output, args.summary, args.workers, args.chunk_size, args.tokenizer,
+                 args.boilerplate_sample, args.boilerplate_model)
+    print(f"{args.summary}와 {args.output} 파일이 생성되었습니다.")
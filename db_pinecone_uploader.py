@@ -1,19 +1,46 @@
 # db uploading with text-embedding-ada-002 as a sentence embedding model
 
 import os
-import json
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from dotenv import load_dotenv
 from pinecone import Pinecone, ServerlessSpec
-from openai import OpenAI
+from embedding_engine import embed_texts
+from embedding_cache import get_embedding_cache
+from instrumentation import count, dump_metrics, span
+from product_parser import PRODUCT_FIELDS, product_metadata
+from result_cache import publish_index_version
+from ngram_index import NgramIndex, product_name, index_path as ngram_index_path
+from corpus_store import iter_records
+from jsonl_store import JsonlWriter, iter_jsonl
+from rate_control import retry_with_backoff
+from vector_store import PineconeStore, normalize_vectors, open_vector_store
 
 # Load environment variables
 load_dotenv()
 
-def load_crawled_data(file_path='cleaned_data.json'):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
-    
+CHECKPOINT_PATH = 'upload_checkpoint.jsonl'
+# Fields the upload reads; the corpus store only decompresses these columns
+UPLOAD_COLUMNS = ("id", "url", "category", "cleaned_text", "all_text", "product_name", "embedded_data") + PRODUCT_FIELDS
+
+def load_crawled_data(file_path='processed_data.corpus', columns=None):
+    # Stream records from a .corpus store, JSON array or JSONL file; columns limits the fields read
+    return iter_records(file_path, columns)
+
+def load_committed_ids(checkpoint_path=CHECKPOINT_PATH):
+    if not os.path.exists(checkpoint_path):
+        return set()
+    return {id_ for record in iter_jsonl(checkpoint_path) for id_ in record.get('ids', [])}
+
+def iter_chunks(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
 
 def preprocess_text(text):
     text = re.sub(r'[^\w\s]', '', text)
@@ -23,11 +50,150 @@ def clean_key(key):
     return re.sub(r'[^a-z0-9-]', '', key.lower().replace(' ', '-'))
 
 def get_openai_embedding(text):
-    client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-    response = client.embeddings.create(input=[text], model="text-embedding-ada-002")
-    return response.data[0].embedding
+    return embed_texts([text])[0]
+
+def get_openai_embeddings(texts):
+    # Unchanged texts come from the embedding cache; the rest are packed into
+    # multi-input requests and sent concurrently
+    return embed_texts(texts)
+
+def upsert_batch(index, batch, embeddings):
+    ids = [clean_key(str(item["id"])) for item in batch]
+    # Typed product fields (price, discount_rate, ...) are stored as-is so queries can filter on them
+    metadata = [{
+        k: v for k, v in {
+            "id": id_,
+            "category": item.get("category", ""),
+            "url": item.get("url", ""),
+            **product_metadata(item)
+        }.items() if v not in (None, "")
+    } for id_, item in zip(ids, batch)]
+
+    # Stored unit-length so query-side re-ranking is a plain dot product
+    to_upsert = list(zip(ids, normalize_vectors(embeddings).tolist(), metadata))
+    with span("vector_upsert"):
+        index.upsert(vectors=to_upsert)
+    count("vectors_upserted_total", len(to_upsert))
+
+def upload_batches(index, data, batch_size=100, window_batches=10, upsert_workers=4, max_attempts=5,
+                   checkpoint_path=CHECKPOINT_PATH, embed_fn=None, name_index=None):
+    # Pipelined upload: the next window of batches is embedded while the current
+    # window is upserted by several workers. Each committed batch is appended to
+    # the checkpoint so a restarted run skips it.
+    # Every product, including already committed ones, goes into name_index.
+    embed_fn = embed_fn or get_openai_embeddings
+    committed = load_committed_ids(checkpoint_path)
+
+    def iter_pending():
+        for item in data:
+            id_ = clean_key(str(item["id"]))
+            if name_index is not None:
+                name_index.add(id_, product_name(item))
+            if id_ not in committed:
+                yield item
+
+    pending_items = iter_pending()
+    windows = iter_chunks(pending_items, batch_size * window_batches)
+
+    def embed_window(window):
+        # The cleaner's output carries boilerplate-stripped cleaned_text; raw crawl records only have all_text
+        return window, embed_fn([preprocess_text(item.get('cleaned_text') or item.get('all_text', ''))
+                                 for item in window])
+
+    def upsert_with_retry(batch, embeddings):
+        retry_with_backoff(
+            lambda: upsert_batch(index, batch, embeddings),
+            max_attempts=max_attempts, base_delay=1.0, max_delay=30.0,
+            on_retry=lambda e, delay: print(f"Upsert failed ({e}). Retrying in {delay:.1f} seconds..."),
+        )
+        checkpoint.write({"ids": [clean_key(str(item["id"])) for item in batch]})
+        return len(batch)
+
+    uploaded = 0
+    failed_batches = 0
+    in_flight = deque()
+
+    def drain(limit):
+        nonlocal uploaded, failed_batches
+        while len(in_flight) > limit:
+            future = in_flight.popleft()
+            try:
+                uploaded += future.result()
+                print(f"Uploaded {uploaded} product information to Pinecone.")
+            except Exception as e:
+                failed_batches += 1
+                print(f"Giving up on a batch after {max_attempts} attempts: {e}")
+
+    with JsonlWriter(checkpoint_path) as checkpoint, \
+            ThreadPoolExecutor(max_workers=1) as embed_executor, \
+            ThreadPoolExecutor(max_workers=upsert_workers) as upsert_executor:
+        first_window = next(windows, None)
+        next_embedding = embed_executor.submit(embed_window, first_window) if first_window else None
+        while next_embedding is not None:
+            window, window_embeddings = next_embedding.result()
+            following = next(windows, None)
+            next_embedding = embed_executor.submit(embed_window, following) if following else None
+
+            for j in range(0, len(window), batch_size):
+                in_flight.append(upsert_executor.submit(
+                    upsert_with_retry, window[j:j+batch_size], window_embeddings[j:j+batch_size]
+                ))
+                drain(upsert_workers * 2)
+        drain(0)
+
+    if failed_batches == 0 and os.path.exists(checkpoint_path):
+        # Everything landed; the next run starts from scratch
+        os.remove(checkpoint_path)
+    return uploaded, failed_batches
+
+def upload_to_pinecone(data, index=None, checkpoint_path=CHECKPOINT_PATH, name_index_path=None):
+    # Defaults to NGRAM_INDEX_PATH, the same file the extractors read
+    name_index_path = name_index_path or ngram_index_path()
+    try:
+        if index is None:
+            index = connect_index()
+
+        print("Starting data upload")
+        # Incremental uploads only carry changed products; extend the saved index so
+        # products that are already in the vector store stay searchable
+        name_index = NgramIndex.load(name_index_path)
+        uploaded, failed_batches = upload_batches(index, data, checkpoint_path=checkpoint_path,
+                                                  name_index=name_index)
+        # Lexical candidate index used by the extractors' hybrid search
+        name_index.save(name_index_path)
+        print(f"Saved {len(name_index)} product names to {name_index_path}")
+        if uploaded:
+            # New vectors invalidate every cached ingredient search result
+            version = publish_index_version(uploaded=uploaded, products=len(name_index))
+            print(f"Published index version {version}")
+
+        if failed_batches:
+            print(f"Uploaded {uploaded} product information; {failed_batches} batches failed. "
+                  f"Run again to resume from {checkpoint_path}.")
+        else:
+            print(f"Successfully uploaded a total of {uploaded} product information to Pinecone.")
+        cache_stats = get_embedding_cache().stats()
+        print(f"Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+              f"(hit rate {cache_stats['hit_rate']:.1%})")
+    
+    except Exception as e:
+        print(f"Error during Pinecone operation: {e}")
+        if hasattr(e, 'response'):
+            print(f"Response status code: {e.response.status_code}")
+            print(f"Response content: {e.response.text}")
+    finally:
+        # Per-stage timings and token counts, written when METRICS_PATH is set
+        metrics_path = dump_metrics()
+        if metrics_path:
+            print(f"Metrics written to {metrics_path}")
+
+def connect_index(index_name="kurlyproducts-openai"):
+    # VECTOR_STORE=local uploads into an on-disk index, VECTOR_STORE=http into a REST endpoint
+    if os.getenv('VECTOR_STORE', 'pinecone') != 'pinecone':
+        store = open_vector_store(index_name, dimension=1536)
+        print(f"Index '{index_name}' opened ({type(store).__name__})")
+        return store
 
-def upload_to_pinecone(data):
     # Get Pinecone settings from environment variables
     api_key = os.getenv('PINECONE_API_KEY')
     cloud = os.getenv('PINECONE_CLOUD', 'aws')
@@ -39,56 +205,25 @@ def upload_to_pinecone(data):
     # Initialize Pinecone
     pc = Pinecone(api_key=api_key)
     
-    # Set index name
-    index_name = "kurlyproducts-openai"
-    
     # Create index if it doesn't exist
-    try:
-        if index_name not in pc.list_indexes().names():
-            pc.create_index(
-                name=index_name,
-                dimension=1536,  # OpenAI's text-embedding-ada-002 dimension
-                metric='cosine',
-                spec=ServerlessSpec(cloud=cloud, region=region)
-            )
-        print(f"Index '{index_name}' created or connected successfully")
-        
-        # Connect to the index
-        index = pc.Index(index_name)
-        print("Index connected")
-        
-        print("Starting data upload")
-        
-        # Upload data to Pinecone
-        batch_size = 100
-        for i in range(0, len(data), batch_size):
-            batch = data[i:i+batch_size]
-            ids = [clean_key(str(item["id"])) for item in batch]
-            texts = [preprocess_text(item.get('all_text', '')) for item in batch]
-            embeddings = [get_openai_embedding(text) for text in texts]
-            metadata = [{
-                clean_key(k): v for k, v in {
-                    "category": item.get("category", ""),
-                    "url": item.get("url", "")
-                }.items() if v
-            } for item in batch]
-            
-            to_upsert = list(zip(ids, embeddings, metadata))
-            index.upsert(vectors=to_upsert)
-            print(f"Uploaded {i+len(batch)} product information to Pinecone.")
-        
-        print(f"Successfully uploaded a total of {len(data)} product information to Pinecone.")
+    if index_name not in pc.list_indexes().names():
+        pc.create_index(
+            name=index_name,
+            dimension=1536,  # OpenAI's text-embedding-ada-002 dimension
+            metric='cosine',
+            spec=ServerlessSpec(cloud=cloud, region=region)
+        )
+    print(f"Index '{index_name}' created or connected successfully")
     
-    except Exception as e:
-        print(f"Error during Pinecone operation: {e}")
-        if hasattr(e, 'response'):
-            print(f"Response status code: {e.response.status_code}")
-            print(f"Response content: {e.response.text}")
+    # Connect to the index
+    index = PineconeStore(index=pc.Index(index_name))
+    print("Index connected")
+    return index
 
 if __name__ == "__main__":
     try:
-        # Load crawled data
-        crawled_data = load_crawled_data()
+        # Load the cleaner's output (data_cleaner.py)
+        crawled_data = load_crawled_data(columns=UPLOAD_COLUMNS)
         
         # Upload data to Pinecone
         upload_to_pinecone(crawled_data)
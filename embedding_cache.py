@@ -0,0 +1,144 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+
+CACHE_PATH = "embedding_cache.db"
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def cache_key(model, text):
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+# 모델명과 정규화한 텍스트의 해시를 키로 임베딩 벡터를 저장하는 디스크 캐시.
+# 벡터는 float32(또는 float16)로 압축해서 저장하고, 전체 크기가 한도를 넘으면
+# 가장 오래 쓰이지 않은 항목부터 지운다.
+class EmbeddingCache:
+    def __init__(self, path=CACHE_PATH, dtype="float32", max_bytes=MAX_CACHE_BYTES):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dtype TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings (last_access)")
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, model, texts):
+        keys = [cache_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            unique_keys = list(set(keys))
+            for i in range(0, len(unique_keys), 500):
+                chunk = unique_keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, dtype, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, dtype, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=dtype).astype(np.float32).tolist()
+            if found:
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                        [(time.time(), key) for key in found],
+                    )
+            hits = sum(key in found for key in keys)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return [found.get(key) for key in keys]
+
+    def put_many(self, model, texts, vectors):
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            blob = np.asarray(vector, dtype=self.dtype).tobytes()
+            rows.append((cache_key(model, text), model, self.dtype.name, blob, now))
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dtype, vector, last_access) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+            self._total_bytes += sum(len(row[3]) for row in rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # 한도의 90%가 될 때까지 오래된 항목부터 지운다
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+        target = self.max_bytes * 0.9
+        with self._conn:
+            while self._total_bytes > target:
+                rows = self._conn.execute(
+                    "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_access LIMIT 1000"
+                ).fetchall()
+                if not rows:
+                    break
+                victims = []
+                for key, size in rows:
+                    if self._total_bytes <= target:
+                        break
+                    victims.append((key,))
+                    self._total_bytes -= size
+                self._conn.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+
+    def get_or_compute(self, model, texts, compute):
+        # 캐시에 없는 텍스트만 (중복 없이) 한 번에 compute로 임베딩한다
+        texts = list(texts)
+        vectors = self.get_many(model, texts)
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(cache_key(model, texts[i]), []).append(i)
+        if missing:
+            miss_texts = [texts[positions[0]] for positions in missing.values()]
+            computed = compute(miss_texts)
+            self.put_many(model, miss_texts, computed)
+            for positions, vector in zip(missing.values(), computed):
+                for i in positions:
+                    vectors[i] = list(vector)
+        return vectors
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "bytes": self._total_bytes,
+            }
+
+    def close(self):
+        self._conn.close()
+
+@lru_cache(maxsize=None)
+def get_embedding_cache():
+    return EmbeddingCache(
+        os.getenv("EMBEDDING_CACHE_PATH", CACHE_PATH),
+        dtype=os.getenv("EMBEDDING_CACHE_DTYPE", "float32"),
+        max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", MAX_CACHE_BYTES)),
+    )
@@ -0,0 +1,107 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from clients import get_openai_client
+from embedding_cache import get_embedding_cache
+from instrumentation import count, in_current_context, span
+from rate_control import UsageBudget, retry_with_backoff
+from token_counter import get_token_counter, EMBEDDING_MODEL, EMBEDDING_TOKEN_LIMIT
+
+# OpenAI 임베딩 API의 요청당 한도
+MAX_BATCH_ITEMS = 2048
+MAX_BATCH_TOKENS = 300000
+
+def _is_retryable(e):
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+    return isinstance(e, (APIConnectionError, APITimeoutError, InternalServerError, RateLimitError))
+
+# 여러 텍스트를 요청당 항목/토큰 한도에 맞춰 묶어서 보내고, 묶음 요청들을 RPM/TPM 한도 안에서
+# 동시에 실행한다. 결과는 입력 순서와 같다.
+class EmbeddingEngine:
+    def __init__(self, model=EMBEDDING_MODEL, client=None, max_batch_items=MAX_BATCH_ITEMS,
+                 max_batch_tokens=MAX_BATCH_TOKENS, max_input_tokens=EMBEDDING_TOKEN_LIMIT, max_concurrency=4,
+                 requests_per_minute=None, tokens_per_minute=None, token_counter="tiktoken", max_attempts=5):
+        self.model = model
+        self.client = client or get_openai_client()
+        self.max_batch_items = max_batch_items
+        self.max_batch_tokens = max_batch_tokens
+        self.max_input_tokens = max_input_tokens
+        self.max_attempts = max_attempts
+        self.counter = get_token_counter(token_counter)
+        self.budget = UsageBudget(requests_per_minute, tokens_per_minute)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.tokens = 0
+
+    def pack(self, texts):
+        # 입력 순서를 유지한 채 (시작 위치, 텍스트 목록, 토큰 수) 묶음으로 나눈다
+        counts = self.counter.count_batch(texts)
+        batches = []
+        start, batch, batch_tokens = 0, [], 0
+        for i, (text, count) in enumerate(zip(texts, counts)):
+            if count > self.max_input_tokens:
+                text = self.counter.truncate(text, self.max_input_tokens)
+                count = self.max_input_tokens
+            if batch and (len(batch) >= self.max_batch_items or batch_tokens + count > self.max_batch_tokens):
+                batches.append((start, batch, batch_tokens))
+                start, batch, batch_tokens = i, [], 0
+            # 빈 문자열은 API가 거부한다
+            batch.append(text or " ")
+            batch_tokens += count
+        if batch:
+            batches.append((start, batch, batch_tokens))
+        return batches
+
+    def _embed_batch(self, batch, batch_tokens):
+        def _request():
+            self.budget.acquire(batch_tokens)
+            return self.client.embeddings.create(input=batch, model=self.model)
+
+        with span("embedding_request", model=self.model):
+            response = retry_with_backoff(
+                _request, retry_on=(Exception,), should_retry=_is_retryable,
+                max_attempts=self.max_attempts, base_delay=1.0, max_delay=30.0,
+                on_retry=lambda e, delay: count("embedding_retries_total", model=self.model),
+            )
+        count("embedding_texts_total", len(batch), model=self.model)
+        count("embedding_tokens_total", batch_tokens, model=self.model)
+        with self._stats_lock:
+            self.requests += 1
+            self.tokens += batch_tokens
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def embed(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        batches = self.pack(texts)
+        futures = [(start, self.executor.submit(in_current_context(self._embed_batch), batch, tokens)) for start, batch, tokens in batches]
+
+        embeddings = [None] * len(texts)
+        for start, future in futures:
+            for offset, embedding in enumerate(future.result()):
+                embeddings[start + offset] = embedding
+        return embeddings
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+@lru_cache(maxsize=None)
+def get_embedding_engine(model=EMBEDDING_MODEL):
+    def _int_env(name):
+        value = os.getenv(name)
+        return int(value) if value else None
+
+    return EmbeddingEngine(
+        model,
+        max_concurrency=_int_env("EMBEDDING_CONCURRENCY") or 4,
+        requests_per_minute=_int_env("EMBEDDING_RPM"),
+        tokens_per_minute=_int_env("EMBEDDING_TPM"),
+    )
+
+def embed_texts(texts, model=EMBEDDING_MODEL):
+    # 프로젝트의 모든 OpenAI 임베딩 호출은 디스크 캐시를 거친다
+    return get_embedding_cache().get_or_compute(model, texts, get_embedding_engine(model).embed)
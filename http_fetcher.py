@@ -0,0 +1,186 @@
+import json
+import re
+import threading
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import count, span
+from product_parser import parse_product
+from rate_control import get_rate_controller, retry_with_backoff
+
+NEXT_DATA_PATTERN = re.compile(
+    r'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.DOTALL
+)
+
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.0 Safari/605.1.15"
+)
+
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg"}
+BLOCK_TAGS = {
+    "p", "div", "li", "ul", "ol", "br", "tr", "table", "section", "article", "header", "footer",
+    "nav", "h1", "h2", "h3", "h4", "h5", "h6", "dl", "dt", "dd", "button", "main", "aside",
+}
+
+# 서버에서 렌더링된 HTML에서 브라우저의 body.text와 비슷한 텍스트와 상품 링크를 뽑는다
+class _PageParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._skip_depth = 0
+        self._in_body = False
+        self._parts = []
+        self._link_href = None
+        self._link_parts = []
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "body":
+            self._in_body = True
+        elif tag == "a":
+            href = dict(attrs).get("href") or ""
+            if "/goods/" in href:
+                self._link_href = href
+                self._link_parts = []
+        if tag in BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag == "a" and self._link_href is not None:
+            self.links.append((self._link_href, " ".join("".join(self._link_parts).split())))
+            self._link_href = None
+        if tag in BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def handle_data(self, data):
+        if self._skip_depth or not self._in_body:
+            return
+        self._parts.append(data)
+        if self._link_href is not None:
+            self._link_parts.append(data)
+
+    def text(self):
+        lines = (" ".join(line.split()) for line in "".join(self._parts).split("\n"))
+        return "\n".join(line for line in lines if line)
+
+def is_throttle_response_error(e):
+    if isinstance(e, (requests.Timeout, requests.ConnectionError)):
+        return True
+    response = getattr(e, "response", None)
+    status = getattr(response, "status_code", None)
+    return status is not None and (status == 429 or status >= 500)
+
+def product_id_from_url(product_url):
+    return product_url.split("?")[0].rstrip("/").split("/")[-1]
+
+def parse_page(html):
+    parser = _PageParser()
+    parser.feed(html)
+    parser.close()
+    return parser
+
+def extract_next_data(html):
+    match = NEXT_DATA_PATTERN.search(html)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(1))
+    except json.JSONDecodeError:
+        return None
+
+def extract_embedded_product(next_data):
+    if not next_data:
+        return None
+    page_props = next_data.get("props", {}).get("pageProps", {})
+    product = page_props.get("product")
+    return product if isinstance(product, dict) else None
+
+# 브라우저 없이 keep-alive HTTP 연결 풀로 페이지를 가져오는 백엔드.
+# 서버 렌더링 결과가 없으면 (클라이언트 렌더링 페이지) fallback 백엔드(Selenium)로 넘긴다.
+class HttpFetcher:
+    def __init__(self, pool_size=10, timeout=20, fallback_factory=None, max_attempts=4):
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": USER_AGENT, "Accept-Language": "ko-KR,ko;q=0.9"})
+        # 재시도는 호스트별 속도 조절기와 함께 retry_with_backoff에서 처리한다
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._fallback_factory = fallback_factory
+        self._fallback = None
+        self._fallback_lock = threading.Lock()
+
+    def _get_fallback(self):
+        if self._fallback_factory is None:
+            return None
+        with self._fallback_lock:
+            if self._fallback is None:
+                self._fallback = self._fallback_factory()
+        return self._fallback
+
+    def _get_html(self, url):
+        def _get():
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            response.encoding = response.encoding or "utf-8"
+            return response.text
+
+        return retry_with_backoff(
+            _get, get_rate_controller(urlparse(url).netloc),
+            retry_on=(requests.Timeout, requests.ConnectionError, requests.HTTPError),
+            is_throttle=is_throttle_response_error,
+            should_retry=is_throttle_response_error,
+            max_attempts=self.max_attempts,
+            on_retry=lambda e, delay: count("crawl_retries_total", backend="http"),
+        )
+
+    def fetch_listing(self, url):
+        with span("crawl_fetch", kind="listing", backend="http"):
+            html = self._get_html(url)
+        page = parse_page(html)
+        listings = []
+        seen = set()
+        for href, listing_text in page.links:
+            link = urljoin(url, href)
+            if link not in seen:
+                seen.add(link)
+                listings.append((link, listing_text))
+
+        # 서버가 렌더링한 빈 페이지(카테고리의 마지막 페이지 다음)는 그대로 빈 목록을 돌려준다.
+        # __NEXT_DATA__도 없으면 목록을 브라우저에서 그리는 페이지이므로 그때만 브라우저로 다시 가져온다.
+        if not listings and extract_next_data(html) is None and self._fallback_factory is not None:
+            return self._get_fallback().fetch_listing(url)
+        return listings
+
+    def fetch_product(self, product_url):
+        with span("crawl_fetch", kind="product", backend="http"):
+            html = self._get_html(product_url)
+        with span("crawl_parse"):
+            all_text = parse_page(html).text()
+            embedded = extract_embedded_product(extract_next_data(html))
+
+        if not all_text and self._fallback_factory is not None:
+            return self._get_fallback().fetch_product(product_url)
+
+        product_data = {
+            "id": product_id_from_url(product_url),
+            "url": product_url,
+            "all_text": all_text,
+        }
+        if embedded is not None:
+            product_data["embedded_data"] = embedded
+        product_data.update(parse_product(product_data))
+        return product_data
+
+    def close(self):
+        self.session.close()
+        if self._fallback is not None:
+            self._fallback.close()
@@ -1,25 +1,19 @@
 
 
-import os
-import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Dict
-from openai import OpenAI
-from openai.types.chat import ChatCompletion
-from openai import OpenAIError, RateLimitError, APIError
-from pinecone import Pinecone
+from clients import get_openai_client, get_vector_store
+from embedding_engine import embed_texts
+from instrumentation import in_current_context, span
+from llm_cache import get_llm_cache, parse_json_content, record_llm_usage
+from ngram_index import get_ngram_index
+from product_parser import product_filter
+from result_cache import MISSING, get_result_cache, make_key
+from token_counter import EMBEDDING_MODEL
 
-from dotenv import load_dotenv
-
-# .env 파일에서 환경 변수 로드 (만약 .env 파일을 사용한다면)
-load_dotenv()
-
-# OpenAI 클라이언트 설정
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-# Pinecone 설정
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-index = pc.Index("kurlyproducts-klue-roberta-base") 
+# 벡터 인덱스 (VECTOR_STORE=local 이면 로컬 인덱스 사용). 클라이언트와 인덱스는 처음 쓸 때 만들어서 공유합니다.
+INDEX_NAME = "kurlyproducts-klue-roberta-base"
 
 
 # 레시피 텍스트 준비 (예시)
@@ -33,8 +27,8 @@ recipe_text = """
 6. 파마산 치즈를 뿌려 마무리한다.
 """
 
-# 프롬프트 설계
-prompt = f"""
+# 프롬프트 설계 (템플릿을 바꾸면 PROMPT_VERSION도 올려서 캐시된 결과를 무효화합니다)
+PROMPT_TEMPLATE = """
 다음 레시피에서 필요한 모든 재료를 추출하여 JSON 형식의 리스트로 작성해주세요. 
 수량은 제외하고 재료명만 포함하세요.
 
@@ -44,29 +38,27 @@ prompt = f"""
 JSON 형식 예시:
 {{"ingredients": ["재료1", "재료2", "재료3"]}}
 """
+PROMPT_VERSION = 1
+EXTRACTION_MODEL = "gpt-4o-mini"
 
 # 검색에서 제외할 재료
 EXCLUDED_INGREDIENTS = {'물'}  # 제외할 재료들의 집합
 
 
-def extract_ingredients(retry_attempts: int = 3, retry_delay: int = 5) -> List[str]:
+def _request_ingredients(recipe_text: str, retry_attempts: int, retry_delay: int) -> List[str]:
+    from openai import OpenAIError, RateLimitError, APIError
     for attempt in range(retry_attempts):
         try:
-            response: ChatCompletion = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "당신은 레시피에서 재료를 추출하는 전문가입니다."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            print(response)
-            text = response.choices[0].message.content
-            if text.startswith('```json\n'):
-                text = text[8:-4]
-
-            # result = json.loads(response.choices[0].message.content)
-            result = json.loads(text)
-            return [ingredient for ingredient in result['ingredients'] if ingredient.lower() not in EXCLUDED_INGREDIENTS]
+            with span("llm_call", model=EXTRACTION_MODEL, purpose="extract_ingredients"):
+                response = get_openai_client().chat.completions.create(
+                    model=EXTRACTION_MODEL,
+                    messages=[
+                        {"role": "system", "content": "당신은 레시피에서 재료를 추출하는 전문가입니다."},
+                        {"role": "user", "content": PROMPT_TEMPLATE.format(recipe_text=recipe_text)}
+                    ]
+                )
+            record_llm_usage(response, EXTRACTION_MODEL, "extract_ingredients")
+            return parse_json_content(response.choices[0].message.content)['ingredients']
         except (RateLimitError, APIError, OpenAIError) as e:
             if attempt < retry_attempts - 1:
                 print(f"Error occurred: {e}. Retrying in {retry_delay} seconds...")
@@ -77,61 +69,114 @@ def extract_ingredients(retry_attempts: int = 3, retry_delay: int = 5) -> List[s
             
         except Exception as e:
             print(e)
-
-def search_product_in_pinecone(ingredient: str) -> Optional[Dict[str, str]]:
-    try:
-        response = client.embeddings.create(input=[ingredient], model="text-embedding-ada-002")
-        query_embedding = response.data[0].embedding
-        results = index.query(
+    # 파싱에 끝까지 실패한 응답은 캐시에 남기지 않도록 예외로 알립니다
+    raise ValueError(f"{retry_attempts}번 시도했지만 재료 목록을 파싱하지 못했습니다.")
+
+def extract_ingredients(recipe_text: str, retry_attempts: int = 3, retry_delay: int = 5) -> List[str]:
+    # 같은 레시피는 캐시에서 바로 가져오고, 동시에 들어온 같은 레시피 요청은 LLM 호출 하나를 함께 기다립니다
+    ingredients = get_llm_cache().get_or_compute(
+        EXTRACTION_MODEL, PROMPT_VERSION, recipe_text,
+        lambda: _request_ingredients(recipe_text, retry_attempts, retry_delay)
+    )
+    return [ingredient for ingredient in ingredients if ingredient.lower() not in EXCLUDED_INGREDIENTS]
+
+def _query_candidates(ingredient: str, candidates: List[str], query_embedding: Optional[List[float]],
+                      max_candidates: int = 200, **filters) -> Optional[Dict[str, str]]:
+    if query_embedding is None:
+        with span("query_embedding", model=EMBEDDING_MODEL):
+            query_embedding = embed_texts([ingredient])[0]
+    with span("index_query", index=INDEX_NAME):
+        results = get_vector_store(INDEX_NAME).query(
             vector=query_embedding,
-            top_k=1000,  # 더 많은 결과를 가져옵니다
-            include_metadata=True
+            top_k=min(len(candidates), max_candidates),
+            include_metadata=True,
+            filter=product_filter(candidates, **filters)
         )
-        
-        if not results['matches']:
-            return None
-        
-        # 상품명에 재료명이 포함된 항목들만 필터링
-        filtered_matches = [
-            match for match in results['matches']
-            if ingredient.lower() in match['metadata'].get('product_name', '').lower()
-        ]
-        
-        if not filtered_matches:
-            return None
-        
-        # 필터링된 상품 중 discount_rate가 가장 높은 상품을 찾습니다
-        best_product = max(filtered_matches, key=lambda x: float(x['metadata'].get('discount_rate', 0)))
-        
-        product_id = best_product['metadata'].get('id')
-        product_name = best_product['metadata'].get('product_name', 'Unknown Product')
-        discount_rate = best_product['metadata'].get('discount_rate', '0')
-        
-        if not product_id:
-            return None
-        
-        return {
-            'product_name': product_name,
-            'discount_rate': discount_rate,
-            'link': f"https://www.kurly.com/goods/{product_id}"
-        }
-    except Exception as e:
-        print(f"Error searching for {ingredient}: {e}")
+    
+    if not results['matches']:
         return None
+    
+    # 후보 상품 중 discount_rate가 가장 높은 상품을 찾습니다
+    best_product = max(results['matches'], key=lambda x: (float(x['metadata'].get('discount_rate', 0)), x['score']))
+    
+    product_id = best_product['metadata'].get('id')
+    product_name = get_ngram_index().names.get(product_id) or best_product['metadata'].get('name', 'Unknown Product')
+    discount_rate = best_product['metadata'].get('discount_rate', '0')
+    
+    if not product_id:
+        return None
+    
+    return {
+        'product_name': product_name,
+        'discount_rate': discount_rate,
+        'link': f"https://www.kurly.com/goods/{product_id}"
+    }
+
+def search_product_in_pinecone(ingredient: str, max_candidates: int = 200, **filters) -> Optional[Dict[str, str]]:
+    # filters: max_price, min_discount_rate, delivery_type, brand (인덱스 메타데이터 필터로 전달)
+    return search_products_in_pinecone([ingredient], max_candidates, **filters)[0]
+
+def search_products_in_pinecone(ingredients: List[str], max_candidates: int = 200, max_workers: int = 8,
+                                **filters) -> List[Optional[Dict[str, str]]]:
+    # 레시피의 재료를 한 번에 검색합니다: 임베딩은 요청 한 번으로 만들고, 인덱스 질의는 동시에 보냅니다.
+    # 결과는 재료 순서와 같고, 한 재료의 오류는 해당 재료의 None으로만 남습니다.
+    # 자주 나오는 재료는 결과 캐시에서 바로 돌려줍니다 (인덱스 버전이 바뀌면 무효화).
+    cache = get_result_cache("ingredients_extractor")
+    keys = [make_key(ingredient, max_candidates, filters) for ingredient in ingredients]
+    results: List[Optional[Dict[str, str]]] = [cache.get(key) for key in keys]
+    misses = [i for i, result in enumerate(results) if result is MISSING]
+    for i in misses:
+        results[i] = None
+
+    name_index = get_ngram_index()
+    # 상품명에 재료명이 포함된 상품만 n-gram 색인에서 후보로 뽑고, 벡터 검색은 후보 안에서만 순위를 매깁니다.
+    # 후보는 여기서 자르지 않습니다: 메타데이터 필터와 유사도 순위를 거친 뒤 상위 max_candidates개 중에서
+    # 할인율이 가장 높은 상품을 고르므로, 이름이 긴 상품도 할인 비교에서 빠지지 않습니다.
+    candidates = {i: name_index.search(ingredients[i]) for i in misses}
+    for i in misses:
+        if not candidates[i]:
+            cache.put(keys[i], None)
+    to_search = [i for i in misses if candidates[i]]
+    if not to_search:
+        return results
 
-try:
-    ingredients = extract_ingredients()
-    print("추출된 재료와 구매 링크:")
-    for ingredient in ingredients:
+    try:
+        with span("query_embedding", model=EMBEDDING_MODEL):
+            embeddings = embed_texts([ingredients[i] for i in to_search])
+    except Exception as e:
+        # 묶음 요청이 실패하면 재료마다 따로 임베딩해서 실패를 격리합니다
+        print(f"Batch embedding failed ({e}); embedding ingredients one by one")
+        embeddings = [None] * len(to_search)
 
-        # goods format: https://www.kurly.com/goods/{ID}
+    def _search(i, embedding):
+        try:
+            result = _query_candidates(ingredients[i], candidates[i], embedding, max_candidates, **filters)
+        except Exception as e:
+            # 오류 결과는 캐시하지 않습니다
+            print(f"Error searching for {ingredients[i]}: {e}")
+            return None
+        cache.put(keys[i], result)
+        return result
 
-        product_info = search_product_in_pinecone(ingredient)
-        if product_info:
-            print(f"- {ingredient}: {product_info['product_name']} (할인율: {product_info['discount_rate']}%) - 구매 링크: {product_info['link']}")
-        else:
-            print(f"- {ingredient}: 구매 링크를 찾을 수 없습니다.")
-except Exception as e:
-    print(f"처리 중 오류가 발생했습니다: {e}")
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(to_search))) as executor:
+        futures = [(i, executor.submit(in_current_context(_search), i, embedding))
+                   for i, embedding in zip(to_search, embeddings)]
+        for i, future in futures:
+            results[i] = future.result()
+    return results
+
+if __name__ == "__main__":
+    try:
+        ingredients = extract_ingredients(recipe_text)
+        print("추출된 재료와 구매 링크:")
+        # goods format: https://www.kurly.com/goods/{ID}
+        product_infos = search_products_in_pinecone(ingredients)
+        for ingredient, product_info in zip(ingredients, product_infos):
+            if product_info:
+                print(f"- {ingredient}: {product_info['product_name']} (할인율: {product_info['discount_rate']}%) - 구매 링크: {product_info['link']}")
+            else:
+                print(f"- {ingredient}: 구매 링크를 찾을 수 없습니다.")
+    except Exception as e:
+        print(f"처리 중 오류가 발생했습니다: {e}")
 
     
\ No newline at end of file
@@ -0,0 +1,192 @@
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 파이프라인 단계별 소요 시간(히스토그램)과 카운터(토큰 수, 재시도 수 등)를 프로세스 안에서 모은다.
+# main.py는 /metrics(Prometheus 텍스트)와 /metrics.json으로 내보내고, 배치 스크립트는 끝날 때
+# METRICS_PATH에 JSON 스냅샷을 남긴다. INSTRUMENTATION=0 이면 span/count/observe는 아무 일도 하지 않는다.
+#
+#   with span("index_query", index=INDEX_NAME):
+#       ...
+#   count("embedding_tokens_total", 1234, model="text-embedding-ada-002")
+
+METRIC_PREFIX = "kurly_"
+# 초 단위 히스토그램 구간 (Prometheus 기본값에 긴 LLM/크롤링 호출용 구간을 더했다)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_enabled = os.getenv("INSTRUMENTATION", "1") != "0"
+_lock = threading.Lock()
+_counters = {}
+# (이름, 라벨) → [구간별 개수(+Inf 포함), 합계, 개수, 최댓값]
+_histograms = {}
+# 요청 하나의 span 기록 (trace() 안에서만 설정됨)
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+def set_enabled(enabled):
+    global _enabled
+    _enabled = enabled
+
+def is_enabled():
+    return _enabled
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def count(name, value=1, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, seconds, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0, 0.0]
+        histogram[0][bisect.bisect_left(BUCKETS, seconds)] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+        histogram[3] = max(histogram[3], seconds)
+
+class _Span:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        observe(self.name, elapsed, **self.labels)
+        if exc_type is not None:
+            count(f"{self.name}_errors_total", **self.labels)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace_start, spans = trace
+            spans.append({
+                "name": self.name,
+                "labels": self.labels,
+                "start_ms": round((self.start - trace_start) * 1000, 3),
+                "duration_ms": round(elapsed * 1000, 3),
+                "error": exc_type.__name__ if exc_type is not None else None,
+            })
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+def span(name, **labels):
+    # 블록의 실행 시간을 {name}_seconds 히스토그램에 기록한다 (예외가 나면 {name}_errors_total도 올린다)
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(name, labels)
+
+@contextmanager
+def trace():
+    # 블록 안에서 끝난 span을 순서대로 모아 돌려준다 (요청별 추적용)
+    spans = []
+    token = _current_trace.set((time.perf_counter(), spans))
+    try:
+        yield spans
+    finally:
+        _current_trace.reset(token)
+
+def in_current_context(func):
+    # ThreadPoolExecutor 작업은 contextvar를 물려받지 않으므로 추적 중이면 현재 컨텍스트에서 실행되게 감싼다.
+    # (asyncio.to_thread는 알아서 컨텍스트를 복사한다)
+    if _current_trace.get() is None:
+        return func
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+def snapshot():
+    with _lock:
+        counters = list(_counters.items())
+        histograms = [(key, (list(value[0]), value[1], value[2], value[3])) for key, value in _histograms.items()]
+    return {
+        "counters": [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(counters)
+        ],
+        "timings": [
+            {
+                "name": name,
+                "labels": dict(labels),
+                "count": total,
+                "total_s": round(seconds, 6),
+                "mean_ms": round(seconds / total * 1000, 3) if total else 0,
+                "max_ms": round(maximum * 1000, 3),
+                "buckets": {str(bound): n for bound, n in zip(BUCKETS + ("+Inf",), buckets)},
+            }
+            for (name, labels), (buckets, seconds, total, maximum) in sorted(histograms)
+        ],
+    }
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+def prometheus_text():
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, (list(value[0]), value[1], value[2])) for key, value in _histograms.items())
+
+    lines = []
+    declared = set()
+    for (name, labels), value in counters:
+        metric = METRIC_PREFIX + name
+        if metric not in declared:
+            declared.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_labels_text(labels)} {value}")
+    for (name, labels), (buckets, seconds, total) in histograms:
+        metric = f"{METRIC_PREFIX}{name}_seconds"
+        if metric not in declared:
+            declared.add(metric)
+            lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, n in zip(BUCKETS + ("+Inf",), buckets):
+            cumulative += n
+            lines.append(f"{metric}_bucket{_labels_text(labels, [('le', str(bound))])} {cumulative}")
+        lines.append(f"{metric}_sum{_labels_text(labels)} {seconds}")
+        lines.append(f"{metric}_count{_labels_text(labels)} {total}")
+    return "\n".join(lines) + "\n"
+
+def dump_metrics(path=None):
+    # 배치 스크립트(크롤러, 정제, 업로더)가 끝날 때 METRICS_PATH로 지정한 파일에 스냅샷을 남긴다
+    path = path or os.getenv("METRICS_PATH")
+    if not path or not _enabled:
+        return None
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f, ensure_ascii=False, indent=2)
+    return path
@@ -0,0 +1,156 @@
+import fcntl
+import json
+import os
+import threading
+
+# 한 줄에 한 레코드씩 추가만 하는 JSONL 파일.
+# 레코드마다 flush/fsync 하므로 크래시가 나도 마지막 레코드까지는 디스크에 남는다.
+# 여러 프로세스가 같은 파일에 쓸 때는 shared=True로 열어 줄 단위로 파일 잠금을 건다.
+class JsonlWriter:
+    def __init__(self, path, durable=True, truncate=False, shared=False):
+        self.path = path
+        self.durable = durable
+        self.shared = shared
+        self._file = open(path, 'w' if truncate else 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        if not truncate:
+            # 다른 프로세스가 쓰는 도중인 줄을 자르지 않도록 잠금을 잡고 정리한다
+            if shared:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            try:
+                repair_tail(path)
+            finally:
+                if shared:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self.shared:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            try:
+                self._file.write(line)
+                self._file.flush()
+                if self.durable:
+                    os.fsync(self._file.fileno())
+            finally:
+                if self.shared:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def repair_tail(path):
+    # 쓰는 도중 중단되어 개행 없이 잘린 마지막 줄을 잘라낸다
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+
+        pos = size
+        while pos > 0:
+            step = min(65536, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                f.truncate(pos + newline + 1)
+                return
+        f.truncate(0)
+
+def iter_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # 잘린 줄은 건너뛴다
+                continue
+
+def load_completed_ids(path):
+    # 출력 파일 자체가 상품 단위 체크포인트 역할을 한다
+    if not os.path.exists(path):
+        return set()
+    return {str(record['id']) for record in iter_jsonl(path) if 'id' in record}
+
+def _iter_json_array(f, chunk_size=1 << 16):
+    # 큰 JSON 배열 파일을 한 번에 읽지 않고 원소 단위로 꺼낸다
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError("JSON 배열 파일이 아닙니다.")
+    pos = 1
+    eof = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield record
+        pos = end
+
+def iter_json_records(path):
+    # JSON 배열 파일과 JSONL 파일을 모두 레코드 단위 스트림으로 읽는다
+    with open(path, 'r', encoding='utf-8') as f:
+        head = f.read(4096).lstrip()
+    if head.startswith('['):
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from _iter_json_array(f)
+    else:
+        yield from iter_jsonl(path)
+
+class JsonArrayWriter:
+    # 기존 도구와의 호환을 위해 JSON 배열을 원소 단위로 이어서 쓴다
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write('[')
+        self._first = True
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        with self._lock:
+            self._file.write('\n' if self._first else ',\n')
+            self._file.write(json.dumps(record, ensure_ascii=False))
+            self._first = False
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.write('\n]\n')
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
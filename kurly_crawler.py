@@ -1,133 +1,495 @@
 import time
-import random
 import json
 import os
+import queue
+import threading
+import argparse
+import socket
+import multiprocessing
+from itertools import islice
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+import requests
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.safari.options import Options
+from selenium.webdriver.chrome.options import Options as ChromeOptions
 from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
+from corpus_store import count_ids, iter_records, load_ids, open_record_writer
+from product_manifest import ProductManifest, content_hash
+from product_parser import parse_product
+from http_fetcher import HttpFetcher, product_id_from_url, is_throttle_response_error
+from instrumentation import count, dump_metrics, span
+from rate_control import get_rate_controller, rate_stats, retry_with_backoff, backoff_delay
+from work_queue import WorkQueue
 
-def retry_on_exception(func, max_attempts=3, delay=5):
-    for attempt in range(max_attempts):
+BASE_URL = "https://www.kurly.com"
+PRODUCT_SELECTOR = ".css-11kh0cw"
+OUTPUT_PATH = "crawled_data.corpus"
+PROGRESS_PATH = "crawling_progress.json"
+MANIFEST_PATH = "product_manifest.db"
+QUEUE_PATH = "crawl_queue.db"
+
+CATEGORY_NUMBERS = [
+    '018', '019', '032', '085', '249', '251', '383', '722', '907', '908', '909', '910', '911', '912', '913', '914', '915', '916', '918',
+    '383001', '383002', '383003', '383004', '383005', '383006', '383007', '383008', '383009', '383010', '383011',
+    '907001', '907002', '907003', '907004', '907005', '907006', '907007', '907008',
+    '908001', '908002', '908003', '908004', '908005', '908006', '908007', '908008',
+    '909001', '909002', '909003', '909004', '909005', '909006', '909007', '909009', '909010', '909011', '909012', '909013', '909014', '909015',
+    '910001', '910002', '910003', '910004', '910005', '910007', '910009', '910010', '910011', '910012',
+    '912001', '912002', '912003', '912004', '912005', '912008', '912011'
+]
+
+def make_driver(browser="safari"):
+    # safaridriver는 동시에 하나의 세션만 허용하므로 여러 세션이 필요하면 chrome을 사용
+    if browser == "chrome":
+        chrome_options = ChromeOptions()
+        chrome_options.add_argument("--headless=new")
+        driver = webdriver.Chrome(options=chrome_options)
+    else:
+        safari_options = Options()
+        safari_options.add_argument("--headless")
+        driver = webdriver.Safari(options=safari_options)
+    driver.set_page_load_timeout(30)
+    return driver
+
+class DriverPool:
+    # 드라이버 세션 풀. 세션은 필요할 때 최대 size개까지 생성된다.
+    def __init__(self, size, driver_factory=make_driver):
+        self.size = size
+        self._factory = driver_factory
+        self._idle = queue.Queue()
+        self._drivers = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self):
+        driver = self._checkout()
+        try:
+            yield driver
+        except WebDriverException:
+            # 세션이 망가졌을 수 있으므로 폐기하고 다음 요청에서 새로 만든다
+            self._discard(driver)
+            raise
+        else:
+            self._idle.put(driver)
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._drivers) < self.size:
+                driver = self._factory()
+                self._drivers.append(driver)
+                return driver
+        return self._idle.get()
+
+    def _discard(self, driver):
+        with self._lock:
+            self._drivers.remove(driver)
         try:
-            return func()
-        except (NoSuchElementException, TimeoutException, WebDriverException) as e:
-            if attempt == max_attempts - 1:
-                raise
-            print(f"오류 발생: {e}. {delay}초 후 재시도합니다...")
-            time.sleep(delay)
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    def close(self):
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except WebDriverException:
+                pass
+
+def is_throttle_error(e):
+    # 사이트가 느리거나 요청을 제한하고 있다는 신호만 속도를 줄이는 데 쓴다
+    if isinstance(e, TimeoutException):
+        return True
+    return is_throttle_response_error(e)
+
+def retry_on_exception(func, url, max_attempts=4, base_delay=2, max_delay=60):
+    # 같은 호스트의 속도 조절기를 거쳐 호출하고, 실패하면 지터가 들어간 지수 백오프로 재시도한다
+    controller = get_rate_controller(urlparse(url).netloc)
+
+    def on_retry(e, delay):
+        count("crawl_retries_total", backend="selenium")
+        print(f"오류 발생: {e}. {delay:.1f}초 후 재시도합니다...")
+
+    return retry_with_backoff(
+        func, controller,
+        retry_on=(WebDriverException, requests.RequestException),
+        is_throttle=is_throttle_error,
+        max_attempts=max_attempts, base_delay=base_delay, max_delay=max_delay,
+        on_retry=on_retry,
+    )
 
 def crawl_product_detail(driver, product_url):
     def _crawl():
-        driver.get(product_url)
-        WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.TAG_NAME, "body"))
-        )
+        with span("crawl_page_load", kind="product"):
+            driver.get(product_url)
+        with span("crawl_wait", kind="product"):
+            WebDriverWait(driver, 20).until(
+                EC.presence_of_element_located((By.TAG_NAME, "body"))
+            )
         
         # 페이지의 모든 텍스트 추출
         all_text = driver.find_element(By.TAG_NAME, "body").text
         
         # 제품 ID 추출 (URL에서)
-        product_id = product_url.split("/")[-1]
+        product_id = product_id_from_url(product_url)
         
-        return {
+        product_data = {
             "id": product_id,
             "url": product_url,
             "all_text": all_text
         }
+        # 이름/가격/할인율 등은 보일러플레이트 제거 전의 원문에서 바로 뽑아둔다
+        product_data.update(parse_product(product_data))
+        return product_data
     
-    return retry_on_exception(_crawl)
+    return retry_on_exception(_crawl, product_url)
 
-def save_progress(number, page):
-    with open('crawling_progress.json', 'w') as f:
-        json.dump({'last_category': number, 'last_page': page}, f)
+def save_progress(number, page, output_start=0):
+    # 임시 파일에 쓴 뒤 교체하여 중간에 죽어도 진행 파일이 깨지지 않게 한다.
+    # output_start는 이번 실행이 시작할 때 출력 파일에 이미 있던 ID 수다 (증분 모드는 출력에 이어 쓰므로).
+    tmp_path = PROGRESS_PATH + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'last_category': number, 'last_page': page, 'output_start': output_start}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, PROGRESS_PATH)
 
 def load_progress():
-    if os.path.exists('crawling_progress.json'):
-        with open('crawling_progress.json', 'r') as f:
+    if os.path.exists(PROGRESS_PATH):
+        with open(PROGRESS_PATH, 'r') as f:
             return json.load(f)
     return None
 
-def save_data(data):
-    with open('crawled_data.json', 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def clear_progress():
+    if os.path.exists(PROGRESS_PATH):
+        os.remove(PROGRESS_PATH)
 
-def crawl_kurly():
-    numbers = [
-        '018', '019', '032', '085', '249', '251', '383', '722', '907', '908', '909', '910', '911', '912', '913', '914', '915', '916', '918',
-        '383001', '383002', '383003', '383004', '383005', '383006', '383007', '383008', '383009', '383010', '383011',
-        '907001', '907002', '907003', '907004', '907005', '907006', '907007', '907008',
-        '908001', '908002', '908003', '908004', '908005', '908006', '908007', '908008',
-        '909001', '909002', '909003', '909004', '909005', '909006', '909007', '909009', '909010', '909011', '909012', '909013', '909014', '909015',
-        '910001', '910002', '910003', '910004', '910005', '910007', '910009', '910010', '910011', '910012',
-        '912001', '912002', '912003', '912004', '912005', '912008', '912011'
-    ]
+def fetch_product_links(driver, url):
+    with span("crawl_page_load", kind="listing"):
+        driver.get(url)
+    try:
+        with span("crawl_wait", kind="listing"):
+            WebDriverWait(driver, 20).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, PRODUCT_SELECTOR))
+            )
+    except TimeoutException:
+        # 페이지 로드는 끝났는데 상품이 없으면 카테고리의 마지막 페이지를 지난 것이다
+        if driver.execute_script("return document.readyState") == "complete":
+            return []
+        raise
 
-    safari_options = Options()
-    safari_options.add_argument("--headless")
+    # 상세 페이지로 이동하기 전에 링크와 목록 카드 텍스트(상품명, 가격 등)를 모두 읽어둔다
+    # (이동 후에는 요소가 stale 상태가 됨)
+    listings = []
+    for product in driver.find_elements(By.CSS_SELECTOR, PRODUCT_SELECTOR):
+        try:
+            listings.append((product.find_element(By.CSS_SELECTOR, "a").get_attribute("href"), product.text))
+        except NoSuchElementException:
+            continue
+    return listings
+
+# 브라우저로 페이지를 렌더링하는 백엔드. 목록 페이지와 상세 페이지 모두 드라이버 풀에서 세션을 빌려 쓴다
+# (safaridriver는 세션을 하나만 허용하므로 목록 전용 세션을 따로 만들면 안 된다).
+class SeleniumFetcher:
+    def __init__(self, num_workers=1, browser="safari"):
+        self.browser = browser
+        self.pool = DriverPool(num_workers, lambda: make_driver(browser))
+
+    def fetch_listing(self, url):
+        with span("crawl_fetch", kind="listing", backend="selenium"):
+            return retry_on_exception(lambda: self._fetch_listing(url), url)
+
+    def _fetch_listing(self, url):
+        # 목록 페이지는 상세 페이지를 모두 처리한 뒤에 가져오므로 풀에서 세션을 기다리다 막히지 않는다.
+        # 세션이 망가졌으면 풀이 폐기하고 다음 요청에서 새로 만든다.
+        with self.pool.acquire() as driver:
+            return fetch_product_links(driver, url)
 
-    all_data = []
+    def fetch_product(self, product_url):
+        with span("crawl_fetch", kind="product", backend="selenium"), self.pool.acquire() as driver:
+            return crawl_product_detail(driver, product_url)
+
+    def close(self):
+        self.pool.close()
+
+def make_fetcher(fetcher="selenium", num_workers=1, browser="safari", fallback=True):
+    if fetcher == "http":
+        # 서버 렌더링 결과가 비어 있는 페이지만 브라우저로 다시 가져온다
+        fallback_factory = (lambda: SeleniumFetcher(num_workers, browser)) if fallback else None
+        return HttpFetcher(pool_size=num_workers, fallback_factory=fallback_factory)
+    return SeleniumFetcher(num_workers, browser)
+
+def crawl_product_details(fetcher, executor, product_links):
+    # 링크는 executor의 작업 큐로 들어가고 워커 수만큼만 동시에 처리된다
+    futures = [executor.submit(fetcher.fetch_product, link) for link in product_links]
+
+    # 결과는 목록 페이지의 순서를 그대로 유지하며 하나씩 넘겨준다
+    for product_link, future in zip(product_links, futures):
+        try:
+            yield future.result()
+        except Exception as e:
+            print(f"상품 정보 크롤링 중 오류 발생 ({product_link}): {e}")
+
+def print_rate_stats():
+    for host, stats in rate_stats().items():
+        print(f"[{host}] 요청 속도: {stats['rate']}/s, 요청: {stats['requests']}, 실패: {stats['failures']}, "
+              f"제한 감지: {stats['throttled']}, 재시도: {stats['retries']}")
+
+def write_metrics(suffix=None):
+    # METRICS_PATH를 지정하면 단계별 소요 시간과 재시도 횟수를 남긴다 (큐 워커는 프로세스마다 따로)
+    path = os.getenv("METRICS_PATH")
+    if path and suffix:
+        path = f"{path}.{suffix}"
+    if dump_metrics(path):
+        print(f"측정 지표 저장: {path}")
+
+def select_pending(listings, number, completed_ids, manifest):
+    # 이번 실행에서 이미 본 상품과 (증분 모드에서) 목록 정보가 바뀌지 않은 상품은 건너뛰고
+    # 카테고리만 추가로 기록한다
+    pending = []
+    for link, listing_text in listings:
+        product_id = product_id_from_url(link)
+        if manifest is None:
+            if product_id not in completed_ids:
+                pending.append((link, None))
+            continue
+
+        listing_hash = content_hash(listing_text)
+        if product_id in completed_ids or not manifest.needs_fetch(product_id, listing_hash):
+            manifest.touch(product_id, number, listing_hash)
+        else:
+            pending.append((link, listing_hash))
+    return pending
+
+def crawl_kurly(numbers=None, num_workers=1, browser="safari", base_url=BASE_URL, output_path=OUTPUT_PATH,
+                manifest_path=None, fetcher="selenium", fallback=True):
+    numbers = numbers or CATEGORY_NUMBERS
 
     progress = load_progress()
+    if progress and progress['last_category'] not in numbers:
+        # 다른 카테고리 목록으로 돌던 실행의 진행 상황이다. 무시하고 새로 시작하면 출력 파일을 비우고
+        # 끝날 때 그 실행의 진행 파일까지 지우게 되므로 시작하지 않는다.
+        raise ValueError(f"{PROGRESS_PATH}에 카테고리 {progress['last_category']}에서 멈춘 크롤링이 남아 있습니다. "
+                         f"같은 카테고리로 이어서 실행하거나, 새로 시작하려면 {PROGRESS_PATH}를 지우세요.")
     start_index = numbers.index(progress['last_category']) if progress else 0
     start_page = progress['last_page'] if progress else 1
 
-    for number in numbers[start_index:]:
-        driver = webdriver.Safari(options=safari_options)
-        driver.set_page_load_timeout(30)
-        
-        page = start_page if number == numbers[start_index] else 1
+    # 이어서 실행할 때는 이미 저장된 상품을 다시 가져오지 않고, 새 실행이면 출력 파일을 새로 쓴다.
+    # 증분 모드는 바뀐 상품만 쓰므로 새 실행이어도 기존 출력 뒤에 이어 쓴다 (다음 단계는 ID별 마지막 레코드를 읽음).
+    # writer를 먼저 열어야 지난 실행이 블록으로 묶지 못한 레코드(저널)까지 복구된 뒤 ID를 읽는다.
+    writer = open_record_writer(output_path, truncate=not progress and manifest_path is None, durable=True)
+    # 이번 실행에서 쓴 상품만 완료로 본다. 이전 실행의 레코드까지 넣으면 그 뒤 목록 정보가 바뀐 상품도
+    # 매니페스트를 확인하지 않고 건너뛰게 된다.
+    output_start = progress.get('output_start', 0) if progress else count_ids(output_path)
+    completed_ids = load_ids(output_path, output_start) if progress else set()
+    crawled_count = 0
+
+    manifest = ProductManifest(manifest_path) if manifest_path else None
+    fetcher = make_fetcher(fetcher, num_workers, browser, fallback)
+    executor = ThreadPoolExecutor(max_workers=num_workers)
+    finished = False
+
+    try:
+        for number in numbers[start_index:]:
+            page = start_page if number == numbers[start_index] else 1
+            while True:
+                url = f"{base_url}/categories/{number}?page={page}"
+                try:
+                    listings = fetcher.fetch_listing(url)
+
+                    if not listings:
+                        break
+
+                    pending = select_pending(listings, number, completed_ids, manifest)
+                    listing_hashes = {product_id_from_url(link): listing_hash for link, listing_hash in pending}
+                    for product_data in crawl_product_details(fetcher, executor, [link for link, _ in pending]):
+                        product_data["category"] = number
+                        completed_ids.add(product_data["id"])
+                        if manifest is not None:
+                            changed = manifest.record(product_data["id"], number, listing_hashes.get(product_data["id"]),
+                                                      content_hash(product_data["all_text"]))
+                            if not changed:
+                                continue
+                        writer.write(product_data)
+                        crawled_count += 1
+
+                    page += 1
+
+                    # 페이지의 모든 상품이 끝난 뒤에만 진행 상황을 기록한다
+                    save_progress(number, page, output_start)
+
+                except (TimeoutException, requests.Timeout):
+                    print(f"카테고리 {number}의 페이지 {page}를 재시도 후에도 로드하지 못했습니다. 다음 카테고리로 이동합니다.")
+                    break
+                except WebDriverException:
+                    print(f"WebDriver 오류 발생. 카테고리 {number}의 페이지 {page}에서 크롤링을 중단합니다.")
+                    break
+                except requests.RequestException as e:
+                    print(f"HTTP 오류 발생 ({e}). 카테고리 {number}의 페이지 {page}에서 크롤링을 중단합니다.")
+                    break
+
+        finished = True
+    finally:
+        executor.shutdown(wait=True)
+        fetcher.close()
+        writer.close()
+        if manifest is not None:
+            manifest.close()
+
+    print_rate_stats()
+    write_metrics()
+
+    # 모든 카테고리를 마쳤으면 다음 실행은 처음부터 시작한다
+    if finished:
+        clear_progress()
+    return crawled_count
+
+# 작업 큐 모드: 카테고리/페이지와 상품 URL이 각각 하나의 작업이 되고,
+# 여러 프로세스(공유 볼륨을 쓰는 여러 호스트 포함)가 큐에서 작업을 임대해 처리한다.
+LISTING_PRIORITY = 1
+PRODUCT_PRIORITY = 0  # 목록 페이지를 더 펼치기 전에 쌓인 상품부터 처리한다
+
+def seed_queue(work_queue, numbers, base_url=BASE_URL):
+    for number in numbers:
+        work_queue.put("listing", f"listing:{number}:1",
+                       {"category": number, "page": 1, "base_url": base_url}, LISTING_PRIORITY)
+
+def handle_listing_task(work_queue, fetcher, payload, manifest):
+    number, page = payload["category"], payload["page"]
+    listings = fetcher.fetch_listing(f"{payload['base_url']}/categories/{number}?page={page}")
+    if not listings:
+        return
+
+    for link, listing_text in listings:
+        product_id = product_id_from_url(link)
+        listing_hash = content_hash(listing_text)
+        if manifest is not None and not manifest.needs_fetch(product_id, listing_hash):
+            manifest.touch(product_id, number, listing_hash)
+            continue
+        # 여러 카테고리에 걸친 상품은 key가 같으므로 한 번만 큐에 들어간다
+        queued = work_queue.put("product", f"product:{product_id}",
+                                {"url": link, "category": number, "listing_hash": listing_hash}, PRODUCT_PRIORITY)
+        if not queued and manifest is not None:
+            manifest.touch(product_id, number, listing_hash)
+
+    work_queue.put("listing", f"listing:{number}:{page + 1}",
+                   {"category": number, "page": page + 1, "base_url": payload["base_url"]}, LISTING_PRIORITY)
+
+def handle_product_task(fetcher, payload, writer, manifest):
+    product_data = fetcher.fetch_product(payload["url"])
+    product_data["category"] = payload["category"]
+    if manifest is not None:
+        changed = manifest.record(product_data["id"], payload["category"], payload["listing_hash"],
+                                  content_hash(product_data["all_text"]))
+        if not changed:
+            return
+    writer.write(product_data)
+
+def run_queue_worker(queue_path, output_path=OUTPUT_PATH, manifest_path=None, fetcher="selenium", browser="safari",
+                     fallback=True):
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    work_queue = WorkQueue(queue_path)
+    manifest = ProductManifest(manifest_path) if manifest_path else None
+    fetcher = make_fetcher(fetcher, 1, browser, fallback)
+    writer = open_record_writer(output_path, truncate=False, durable=True, shared=True)
+
+    try:
         while True:
-            url = f"https://www.kurly.com/categories/{number}?page={page}"
-            try:
-                driver.get(url)
-                WebDriverWait(driver, 20).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, ".css-11kh0cw"))
-                )
-
-                products = driver.find_elements(By.CSS_SELECTOR, ".css-11kh0cw")
-                
-                if not products:
+            task = work_queue.claim(worker_id)
+            if task is None:
+                # 다른 워커가 처리 중인 목록 페이지가 새 작업을 만들 수 있고, 재시도 대기 중이거나
+                # 죽은 워커가 임대한 작업도 시간이 지나면 다시 가져갈 수 있으므로 모두 끝날 때까지 기다린다
+                counts = work_queue.counts()
+                if counts["pending"] == 0 and counts["leased"] == 0:
                     break
+                time.sleep(1)
+                continue
 
-                for product in products:
-                    try:
-                        product_link = product.find_element(By.CSS_SELECTOR, "a").get_attribute("href")
-                        product_data = crawl_product_detail(driver, product_link)
-                        product_data["category"] = number
-                        all_data.append(product_data)
-                    except Exception as e:
-                        print(f"상품 정보 크롤링 중 오류 발생: {e}")
-                        continue
-
-                page += 1
-                time.sleep(random.uniform(1, 3))
-
-                save_progress(number, page)
-                
-                if len(all_data) % 100 == 0:
-                    save_data(all_data)
-
-            except TimeoutException:
-                print(f"카테고리 {number}의 페이지 {page}를 로드하는 데 실패했습니다. 다음 카테고리로 이동합니다.")
-                break
-            except WebDriverException:
-                print(f"WebDriver 오류 발생. 카테고리 {number}의 페이지 {page}에서 크롤링을 중단합니다.")
-                break
+            try:
+                if task["kind"] == "listing":
+                    handle_listing_task(work_queue, fetcher, task["payload"], manifest)
+                else:
+                    handle_product_task(fetcher, task["payload"], writer, manifest)
+            except Exception as e:
+                print(f"[{worker_id}] 작업 실패 ({task['key']}, {task['attempts']}번째 시도): {e}")
+                work_queue.nack(task["key"], worker_id, e, retry_delay=backoff_delay(task["attempts"], 5))
+            else:
+                work_queue.ack(task["key"], worker_id)
+    finally:
+        fetcher.close()
+        writer.close()
+        work_queue.close()
+        if manifest is not None:
+            manifest.close()
+    print_rate_stats()
+    write_metrics(worker_id)
+
+def crawl_with_queue(queue_path, numbers=None, num_processes=1, base_url=BASE_URL, output_path=OUTPUT_PATH,
+                     manifest_path=None, fetcher="selenium", browser="safari", fallback=True):
+    # 같은 큐 파일로 다시 실행하면 남은 작업부터 이어서 처리한다 (시드는 key 기준으로 중복되지 않음)
+    work_queue = WorkQueue(queue_path)
+    seed_queue(work_queue, numbers or CATEGORY_NUMBERS, base_url)
+
+    worker_args = (queue_path, output_path, manifest_path, fetcher, browser, fallback)
+    processes = [multiprocessing.Process(target=run_queue_worker, args=worker_args) for _ in range(num_processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    counts = work_queue.counts()
+    work_queue.close()
+    return counts
 
-        driver.quit()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="마켓컬리 상품 크롤러")
+    parser.add_argument("--workers", type=int, default=1, help="상세 페이지를 동시에 가져올 브라우저 세션/HTTP 연결 수")
+    parser.add_argument("--fetcher", choices=["selenium", "http"], default="selenium",
+                        help="http: 브라우저 없이 HTML과 내장 데이터를 파싱 (빈 페이지만 브라우저로 다시 가져옴)")
+    parser.add_argument("--no-fallback", action="store_true", help="http 모드에서 브라우저 fallback을 사용하지 않음")
+    parser.add_argument("--browser", choices=["safari", "chrome"], default="safari")
+    parser.add_argument("--base-url", default=BASE_URL, help="테스트용 로컬 사이트 주소 등")
+    parser.add_argument("--categories", nargs="*", help="크롤링할 카테고리 번호 (기본값: 전체)")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="상품 정보를 추가할 파일 (.corpus 또는 .jsonl)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="상품 매니페스트를 이용해 새 상품과 목록 정보가 바뀐 상품만 다시 가져온다")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="증분 모드에서 사용할 매니페스트 파일")
+    parser.add_argument("--queue", nargs="?", const=QUEUE_PATH,
+                        help="작업 큐 모드로 실행 (여러 호스트가 공유 볼륨의 같은 큐 파일을 사용할 수 있음)")
+    parser.add_argument("--processes", type=int, default=1, help="작업 큐 모드에서 실행할 워커 프로세스 수")
+    args = parser.parse_args()
 
-    save_data(all_data)
-    return all_data
+    if args.queue:
+        counts = crawl_with_queue(args.queue, args.categories, num_processes=args.processes, base_url=args.base_url,
+                                  output_path=args.output, manifest_path=args.manifest if args.incremental else None,
+                                  fetcher=args.fetcher, browser=args.browser, fallback=not args.no_fallback)
+        print(f"작업 큐 상태: 완료 {counts['done']}, 실패 {counts['failed']}, "
+              f"대기 {counts['pending']}, 처리 중 {counts['leased']}")
+        raise SystemExit(0)
 
-crawled_data = crawl_kurly()
-print(f"총 {len(crawled_data)}개의 상품 정보를 크롤링했습니다.")
+    try:
+        crawled_count = crawl_kurly(args.categories, num_workers=args.workers, browser=args.browser,
+                                    base_url=args.base_url, output_path=args.output,
+                                    manifest_path=args.manifest if args.incremental else None,
+                                    fetcher=args.fetcher, fallback=not args.no_fallback)
+    except ValueError as e:
+        print(e)
+        raise SystemExit(1)
+    print(f"이번 실행에서 {crawled_count}개의 상품 정보를 크롤링했습니다.")
 
-for product in crawled_data[:5]:
-    print(f"ID: {product['id']}")
-    print(f"Category: {product['category']}")
-    print(f"URL: {product['url']}")
-    print(f"Text (first 200 characters): {product['all_text'][:200]}...")
-    print("-" * 50)
\ No newline at end of file
+    for product in islice(iter_records(args.output), 5):
+        print(f"ID: {product['id']}")
+        print(f"Category: {product['category']}")
+        print(f"URL: {product['url']}")
+        print(f"Text (first 200 characters): {product['all_text'][:200]}...")
+        print("-" * 50)
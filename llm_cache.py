@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from embedding_cache import normalize_text
+from instrumentation import count
+
+CACHE_PATH = "llm_cache.db"
+
+def llm_cache_key(model, template_version, text):
+    return hashlib.sha256(f"{model}\0{template_version}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+def parse_json_content(text):
+    # 모델이 응답을 ```json ... ``` 코드 블록으로 감싸는 경우가 있다
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return json.loads(text)
+
+def record_llm_usage(response, model, purpose):
+    # 채팅 응답의 토큰 사용량을 모델/용도별 카운터에 더한다
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    count("llm_prompt_tokens_total", usage.prompt_tokens or 0, model=model, purpose=purpose)
+    count("llm_completion_tokens_total", usage.completion_tokens or 0, model=model, purpose=purpose)
+
+# 같은 키로 동시에 들어온 호출을 하나로 합친다. 먼저 온 호출만 실제로 실행하고 나머지는 그 결과(또는 예외)를 기다린다.
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"done": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = func()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+# 레시피 → 파싱된 LLM 응답(재료 목록 등)을 모델, 프롬프트 템플릿 버전, 정규화한 입력 텍스트로 저장하는 캐시.
+# compute가 예외를 던지면(요청 실패, JSON 파싱 실패) 아무것도 저장하지 않는다.
+class LLMCache:
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS completions (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    template_version TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM completions WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, key, model, template_version, value):
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO completions (key, model, template_version, value, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, model, str(template_version), json.dumps(value, ensure_ascii=False), time.time()),
+                )
+
+    def get_or_compute(self, model, template_version, text, compute):
+        key = llm_cache_key(model, template_version, text)
+        value = self.get(key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        leader = []
+
+        def _compute():
+            leader.append(True)
+            # 기다리는 사이에 다른 프로세스가 채웠을 수도 있다
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            result = compute()
+            self.put(key, model, template_version, result)
+            return result
+
+        value = self._flight.do(key, _compute)
+        with self._lock:
+            if leader:
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        return value
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": round((self.hits + self.coalesced) / total, 4) if total else 0.0,
+            }
+
+    def close(self):
+        self._conn.close()
+
+@lru_cache(maxsize=None)
+def get_llm_cache():
+    return LLMCache(os.getenv("LLM_CACHE_PATH", CACHE_PATH))
+
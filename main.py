@@ -1 +1,172 @@
-print("Stock_PJT miniconda env 시작")
\ No newline at end of file
+import argparse
+import inspect
+import json
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import ingredients_extractor
+import temp_extractor
+from clients import get_openai_client, get_vector_store
+from embedding_cache import get_embedding_cache
+from instrumentation import prometheus_text, snapshot, span, trace
+from llm_cache import get_llm_cache
+from ngram_index import get_ngram_index
+from product_parser import product_filter
+from query_encoder import get_query_encoder
+from result_cache import get_result_cache
+
+# 레시피 → 상품 추천을 오래 떠 있는 로컬 HTTP/JSON 서비스로 제공한다.
+# 클라이언트와 모델은 처음 한 번만 만들고 모든 요청이 공유하므로, 요청 지연에 모델 로딩 시간이 들어가지 않는다.
+#
+#   GET  /health              상태 확인
+#   GET  /stats               캐시 적중률 등
+#   GET  /metrics             단계별 소요 시간/토큰 수 (Prometheus 텍스트 형식)
+#   GET  /metrics.json        같은 지표의 JSON 스냅샷
+#   POST /recipe              {"recipe": "..."} → 재료별 추천 상품과 추천 문구 (temp_extractor)
+#   POST /recipe/ingredients  {"recipe": "..."} → 재료별 최고 할인 상품 링크 (ingredients_extractor)
+#   POST /search              {"ingredients": ["소금", ...], "filters": {"max_price": 10000}} → 재료별 상품
+#
+# POST 요청에 "X-Trace: 1" 헤더를 붙이면 응답의 "trace"에 그 요청의 단계별 소요 시간이 함께 담긴다.
+
+# /search의 "filters"로 받을 수 있는 키 (후보 ID 목록은 검색 쪽에서 채운다)
+FILTER_KEYS = tuple(name for name in inspect.signature(product_filter).parameters if name != "candidates")
+
+def search_filters(body):
+    # 알 수 없는 키가 검색 함수의 다른 인자(max_workers 등)로 흘러 들어가지 않게 막는다
+    filters = body.get("filters") or {}
+    if not isinstance(filters, dict):
+        raise ValueError("filters는 객체여야 합니다.")
+    for key in filters:
+        if key not in FILTER_KEYS:
+            raise ValueError(f"알 수 없는 필터: {key} (사용 가능: {', '.join(FILTER_KEYS)})")
+    return filters
+
+def warmup():
+    # 서버를 열기 전에 클라이언트, 인덱스, 임베딩 모델을 미리 올려둔다
+    steps = [
+        ("OpenAI 클라이언트", get_openai_client),
+        ("상품명 색인", get_ngram_index),
+        ("벡터 인덱스", lambda: get_vector_store(ingredients_extractor.INDEX_NAME)),
+        ("임베딩 모델", lambda: get_query_encoder(temp_extractor.MODEL_NAME).encode(["warmup"])),
+    ]
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+            print(f"{name} 준비 완료 ({time.perf_counter() - start:.2f}s)")
+        except Exception as e:
+            print(f"{name} 준비 실패: {e}")
+
+def service_stats():
+    return {
+        "ingredient_results": get_result_cache("ingredients_extractor").stats(),
+        "recipe_results": get_result_cache("temp_extractor").stats(),
+        "llm": get_llm_cache().stats(),
+        "embeddings": get_embedding_cache().stats(),
+    }
+
+def recipe_ingredients(recipe_text):
+    ingredients = ingredients_extractor.extract_ingredients(recipe_text)
+    products = ingredients_extractor.search_products_in_pinecone(ingredients)
+    return [{"ingredient": ingredient, "product": product} for ingredient, product in zip(ingredients, products)]
+
+class RecipeRequestHandler(BaseHTTPRequestHandler):
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_text(self, status, text, content_type="text/plain; version=0.0.4; charset=utf-8"):
+        data = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(body, dict):
+            raise ValueError("요청 본문은 JSON 객체여야 합니다.")
+        return body
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self._send_json(200, service_stats())
+        elif self.path == "/metrics":
+            self._send_text(200, prometheus_text())
+        elif self.path == "/metrics.json":
+            self._send_json(200, snapshot())
+        else:
+            self._send_json(404, {"error": f"알 수 없는 경로: {self.path}"})
+
+    def do_POST(self):
+        try:
+            body = self._read_json()
+        except ValueError as e:
+            self._send_json(400, {"error": f"잘못된 JSON 요청: {e}"})
+            return
+
+        if self.path not in ("/recipe", "/recipe/ingredients", "/search"):
+            self._send_json(404, {"error": f"알 수 없는 경로: {self.path}"})
+            return
+
+        if self.path == "/search":
+            try:
+                filters = search_filters(body)
+            except ValueError as e:
+                self._send_json(400, {"error": str(e)})
+                return
+
+        tracing = self.headers.get("X-Trace") == "1"
+        try:
+            with (trace() if tracing else nullcontext()) as spans, span("http_request", path=self.path):
+                if self.path == "/recipe":
+                    result = {"results": temp_extractor.process_recipe(body["recipe"])}
+                elif self.path == "/recipe/ingredients":
+                    result = {"results": recipe_ingredients(body["recipe"])}
+                else:
+                    products = ingredients_extractor.search_products_in_pinecone(
+                        list(body["ingredients"]), **filters
+                    )
+                    result = {"results": [{"ingredient": ingredient, "product": product}
+                                          for ingredient, product in zip(body["ingredients"], products)]}
+        except (KeyError, TypeError) as e:
+            self._send_json(400, {"error": f"필수 항목이 없거나 형식이 잘못되었습니다: {e}"})
+            return
+        except Exception as e:
+            print(f"요청 처리 중 오류 발생 ({self.path}): {e}")
+            self._send_json(500, {"error": str(e)})
+            return
+        if tracing:
+            result["trace"] = spans
+        self._send_json(200, result)
+
+def serve(host="127.0.0.1", port=8000, warm=True):
+    if warm:
+        warmup()
+    server = ThreadingHTTPServer((host, port), RecipeRequestHandler)
+    server.daemon_threads = True
+    print(f"레시피 추천 서비스 시작: http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="레시피 → 상품 추천 HTTP 서비스")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--no-warmup", action="store_true", help="시작할 때 모델/클라이언트를 미리 올리지 않음")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, warm=not args.no_warmup)
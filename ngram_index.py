@@ -0,0 +1,103 @@
+import json
+import os
+import unicodedata
+from functools import lru_cache
+
+INDEX_PATH = "product_name_index.json"
+
+def index_path():
+    # 업로더(쓰는 쪽)와 추출기(읽는 쪽)가 같은 파일을 보도록 경로는 여기서만 정한다
+    return os.getenv("NGRAM_INDEX_PATH", INDEX_PATH)
+
+def compact(text):
+    # 띄어쓰기가 제각각인 상품명("올리브 오일"/"올리브오일")도 같은 문자열로 비교한다
+    return "".join(unicodedata.normalize("NFC", text).lower().split())
+
+def char_ngrams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+def product_name(record):
+    embedded = record.get("embedded_data") or {}
+    return record.get("name") or record.get("product_name") or embedded.get("name") or ""
+
+# 상품명의 글자 단위 1-gram/2-gram 역색인.
+# 재료명을 부분 문자열로 포함하는 상품 후보를 벡터 검색 없이 바로 찾는다.
+class NgramIndex:
+    def __init__(self, names=None):
+        self.names = {}
+        self._compact = {}
+        self._postings = {}
+        for product_id, name in (names or {}).items():
+            self.add(product_id, name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, product_id, name):
+        product_id = str(product_id)
+        if not name:
+            return
+        if product_id in self.names:
+            self.remove(product_id)
+        key = compact(name)
+        self.names[product_id] = name
+        self._compact[product_id] = key
+        for gram in char_ngrams(key, 1) | char_ngrams(key, 2):
+            self._postings.setdefault(gram, set()).add(product_id)
+
+    def remove(self, product_id):
+        key = self._compact.pop(product_id, None)
+        self.names.pop(product_id, None)
+        if key is None:
+            return
+        for gram in char_ngrams(key, 1) | char_ngrams(key, 2):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(product_id)
+                if not postings:
+                    del self._postings[gram]
+
+    def search(self, query, limit=None):
+        # 질의의 2-gram 목록을 가장 짧은 것부터 교집합한 뒤, 실제 부분 문자열인지 확인한다
+        key = compact(query)
+        if not key:
+            return []
+        grams = char_ngrams(key, 2) or char_ngrams(key, 1)
+        postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates &= posting
+        matches = [product_id for product_id in candidates if key in self._compact[product_id]]
+        # 상품명이 짧을수록 재료 자체에 가까운 상품이다
+        matches.sort(key=lambda product_id: (len(self._compact[product_id]), product_id))
+        return matches[:limit] if limit else matches
+
+    def save(self, path=None):
+        path = path or index_path()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"names": self.names}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or index_path()
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f).get("names", {}))
+
+@lru_cache(maxsize=4)
+def _load_index(path, mtime):
+    return NgramIndex.load(path)
+
+def get_ngram_index():
+    # 오래 떠 있는 서비스에서도 업로더가 색인 파일을 새로 쓰면 다음 호출부터 새 색인을 쓴다
+    path = index_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    return _load_index(path, mtime)
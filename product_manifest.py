@@ -0,0 +1,91 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+def content_hash(text):
+    normalized = " ".join((text or "").split())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+# 상품 ID별 해시, 마지막 확인 시각, 카테고리 집합을 기록하는 로컬 매니페스트.
+# 증분 크롤링에서 이미 본 상품이나 변경되지 않은 상품의 상세 페이지를 건너뛰는 데 쓴다.
+class ProductManifest:
+    def __init__(self, path='product_manifest.db'):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._seen_this_run = set()
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS products (
+                    id TEXT PRIMARY KEY,
+                    listing_hash TEXT,
+                    content_hash TEXT,
+                    last_seen REAL,
+                    categories TEXT NOT NULL DEFAULT '[]'
+                )
+            """)
+
+    def _get(self, product_id):
+        return self._conn.execute(
+            "SELECT listing_hash, content_hash, categories FROM products WHERE id = ?", (product_id,)
+        ).fetchone()
+
+    def seen_in_run(self, product_id):
+        return product_id in self._seen_this_run
+
+    def needs_fetch(self, product_id, listing_hash):
+        if product_id in self._seen_this_run:
+            return False
+        with self._lock:
+            row = self._get(product_id)
+        return row is None or row[1] is None or row[0] != listing_hash
+
+    def touch(self, product_id, category, listing_hash=None):
+        # 상세 페이지를 다시 가져오지 않고 마지막 확인 시각과 카테고리만 갱신한다
+        with self._lock, self._conn:
+            row = self._get(product_id)
+            categories = set(json.loads(row[2])) if row else set()
+            categories.add(category)
+            if row is None:
+                self._conn.execute(
+                    "INSERT INTO products (id, listing_hash, last_seen, categories) VALUES (?, ?, ?, ?)",
+                    (product_id, listing_hash, time.time(), json.dumps(sorted(categories))),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE products SET last_seen = ?, categories = ? WHERE id = ?",
+                    (time.time(), json.dumps(sorted(categories)), product_id),
+                )
+        self._seen_this_run.add(product_id)
+
+    def record(self, product_id, category, listing_hash, new_content_hash):
+        # 상세 페이지를 가져온 뒤 호출한다. 목록 정보(가격, 할인율 등)나 본문이 이전과 달라졌으면 True를 돌려준다.
+        with self._lock, self._conn:
+            row = self._get(product_id)
+            categories = set(json.loads(row[2])) if row else set()
+            categories.add(category)
+            changed = row is None or row[0] != listing_hash or row[1] != new_content_hash
+            self._conn.execute(
+                """
+                INSERT INTO products (id, listing_hash, content_hash, last_seen, categories)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    listing_hash = excluded.listing_hash,
+                    content_hash = excluded.content_hash,
+                    last_seen = excluded.last_seen,
+                    categories = excluded.categories
+                """,
+                (product_id, listing_hash, new_content_hash, time.time(), json.dumps(sorted(categories))),
+            )
+        self._seen_this_run.add(product_id)
+        return changed
+
+    def categories(self, product_id):
+        with self._lock:
+            row = self._get(product_id)
+        return json.loads(row[2]) if row else []
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,113 @@
+import re
+from typing import Dict, List, Optional
+
+PRODUCT_FIELDS = ("name", "brand", "price", "original_price", "discount_rate", "delivery_type")
+DELIVERY_TYPES = ("샛별배송", "하루배송", "판매자배송", "택배배송")
+
+PRICE_LINE = re.compile(r"^(\d{1,3}(?:,\d{3})+|\d+)\s*원$")
+DISCOUNT_LINE = re.compile(r"^(\d{1,2})\s*%$")
+BRAND_PREFIX = re.compile(r"^\[([^\]]+)\]\s*")
+# 상품명 위에 붙는 배지 줄 (예: 주말특가, Kurly Only)
+BADGE_LINE = re.compile(r"(특가|Only|한정수량|단독)$")
+
+def _to_int(value) -> Optional[int]:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    digits = re.sub(r"[^\d]", "", str(value))
+    return int(digits) if digits else None
+
+def _price_block(lines: List[str], start: int) -> Dict[str, int]:
+    # 상품명 바로 아래의 [할인율%] 판매가 [정가] 묶음을 읽는다
+    fields = {}
+    for i in range(start, min(start + 8, len(lines))):
+        line = lines[i]
+        discount = DISCOUNT_LINE.match(line)
+        price = PRICE_LINE.match(line)
+        if discount and "discount_rate" not in fields and "price" not in fields:
+            fields["discount_rate"] = int(discount.group(1))
+        elif price and "price" not in fields:
+            fields["price"] = _to_int(price.group(1))
+        elif price:
+            if fields.get("discount_rate") and _to_int(price.group(1)) > fields["price"]:
+                fields["original_price"] = _to_int(price.group(1))
+            break
+        elif "price" in fields:
+            break
+    return fields
+
+def parse_product_text(all_text: str) -> Dict:
+    # 상세 페이지 본문은 (내비게이션) → 배송 유형 → [배지] → 상품명 → 부제 → 할인율/가격 순서로 나온다
+    lines = [line.strip() for line in all_text.splitlines() if line.strip()]
+    fields = {}
+    start = next((i for i, line in enumerate(lines) if line in DELIVERY_TYPES), None)
+    if start is None:
+        return fields
+    fields["delivery_type"] = lines[start]
+
+    for i in range(start + 1, min(start + 4, len(lines))):
+        line = lines[i]
+        if BADGE_LINE.search(line) or PRICE_LINE.match(line) or DISCOUNT_LINE.match(line):
+            continue
+        fields["name"] = line
+        brand = BRAND_PREFIX.match(line)
+        if brand:
+            fields["brand"] = brand.group(1).strip()
+        fields.update(_price_block(lines, i + 1))
+        break
+    return fields
+
+def parse_embedded_product(embedded: Optional[Dict]) -> Dict:
+    # 서버 렌더링 데이터(__NEXT_DATA__)가 있으면 본문 파싱보다 우선한다
+    if not embedded:
+        return {}
+    brand_info = embedded.get("brandInfo") or {}
+    delivery_types = embedded.get("deliveryTypeNames") or []
+    fields = {
+        "name": embedded.get("name"),
+        "brand": embedded.get("brand") or embedded.get("brandName") or brand_info.get("name"),
+        "price": _to_int(embedded.get("discountedPrice") or embedded.get("basePrice")),
+        "original_price": _to_int(embedded.get("retailPrice") or embedded.get("basePrice")),
+        "discount_rate": _to_int(embedded.get("discountRate")),
+        "delivery_type": delivery_types[0] if delivery_types else None,
+    }
+    if fields["original_price"] is not None and fields["original_price"] == fields["price"]:
+        fields["original_price"] = None
+    return {key: value for key, value in fields.items() if value not in (None, "")}
+
+def parse_product(product_data: Dict) -> Dict:
+    # 보일러플레이트 제거 전의 원문에서 뽑아야 배송 유형 같은 공통 문구가 남아 있다
+    fields = parse_product_text(product_data.get("all_text", ""))
+    fields.update(parse_embedded_product(product_data.get("embedded_data")))
+    if fields.get("price") is not None and "discount_rate" not in fields:
+        fields["discount_rate"] = 0
+    return fields
+
+def with_product_fields(product_data: Dict) -> Dict:
+    # 이미 크롤링 단계에서 파싱한 레코드는 그대로 둔다
+    if any(field in product_data for field in PRODUCT_FIELDS):
+        return product_data
+    return dict(product_data, **parse_product(product_data))
+
+def product_metadata(product_data: Dict) -> Dict:
+    return {field: product_data[field] for field in PRODUCT_FIELDS if product_data.get(field) not in (None, "")}
+
+def product_filter(candidates: Optional[List[str]] = None, max_price: Optional[int] = None,
+                   min_discount_rate: Optional[int] = None, delivery_type: Optional[str] = None,
+                   brand: Optional[str] = None) -> Optional[Dict]:
+    # 인덱스 쪽에서 거를 수 있도록 Pinecone 메타데이터 필터로 만든다
+    conditions = []
+    if candidates is not None:
+        conditions.append({"id": {"$in": candidates}})
+    if max_price is not None:
+        conditions.append({"price": {"$lte": max_price}})
+    if min_discount_rate is not None:
+        conditions.append({"discount_rate": {"$gte": min_discount_rate}})
+    if delivery_type is not None:
+        conditions.append({"delivery_type": {"$eq": delivery_type}})
+    if brand is not None:
+        conditions.append({"brand": {"$eq": brand}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
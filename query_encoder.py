@@ -0,0 +1,230 @@
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+
+import numpy as np
+
+from clients import get_sentence_model
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+ONNX_DIR = "onnx_models"
+MAX_SEQ_LENGTH = 256
+
+def _hub_name(model_name):
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+# SentenceTransformer(PyTorch) 그대로 쓰는 기준 백엔드. quantize=True 이면 Linear 층을 동적 int8로 바꾼다.
+class TorchEncoder:
+    def __init__(self, model_name, quantize=False, threads=None):
+        import torch
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = get_sentence_model(model_name)
+        if quantize:
+            from sentence_transformers import SentenceTransformer
+            # 공유 모델은 그대로 두고 복사본을 양자화한다
+            self.model = torch.quantization.quantize_dynamic(
+                SentenceTransformer(model_name), {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+    def encode(self, texts):
+        return np.asarray(self.model.encode(list(texts), normalize_embeddings=True), dtype=np.float32)
+
+def _hidden_states_module(model):
+    # ONNX로 내보낼 때 BERT 입력 순서를 이름으로 고정하는 래퍼
+    import torch
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids).last_hidden_state
+
+    return HiddenStates()
+
+def export_onnx(model_name, output_dir=ONNX_DIR, quantize=False):
+    # Hugging Face 모델을 ONNX로 내보내고, quantize=True 이면 가중치를 int8로 동적 양자화한 파일도 만든다
+    model_dir = os.path.join(output_dir, model_name.replace("/", "__"))
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    int8_path = os.path.join(model_dir, "model.int8.onnx")
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+        os.makedirs(model_dir, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(_hub_name(model_name))
+        model = AutoModel.from_pretrained(_hub_name(model_name)).eval()
+        inputs = tokenizer(["warmup"], return_tensors="pt")
+        dynamic = {0: "batch", 1: "sequence"}
+        with torch.no_grad():
+            torch.onnx.export(
+                _hidden_states_module(model),
+                (inputs["input_ids"], inputs["attention_mask"], inputs["token_type_ids"]),
+                fp32_path,
+                input_names=["input_ids", "attention_mask", "token_type_ids"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={"input_ids": dynamic, "attention_mask": dynamic, "token_type_ids": dynamic,
+                              "last_hidden_state": dynamic},
+                opset_version=14,
+            )
+        tokenizer.save_pretrained(model_dir)
+    if quantize and not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return model_dir, int8_path if quantize else fp32_path
+
+# onnxruntime CPU 백엔드. SentenceTransformer와 같게 mean pooling 후 L2 정규화한다.
+class OnnxEncoder:
+    def __init__(self, model_name, quantize=False, threads=None, output_dir=ONNX_DIR):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        model_dir, model_path = export_onnx(model_name, output_dir, quantize)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+    def encode(self, texts):
+        inputs = self.tokenizer(list(texts), padding=True, truncation=True, max_length=MAX_SEQ_LENGTH,
+                                return_tensors="np")
+        feed = {name: inputs[name].astype(np.int64) for name in ("input_ids", "attention_mask", "token_type_ids")}
+        hidden = self.session.run(["last_hidden_state"], feed)[0]
+        mask = feed["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+# 여러 스레드에서 동시에 들어온 encode 요청을 짧은 시간 창(max_wait_ms) 동안 모아서 한 번에 인코딩한다.
+class MicroBatcher:
+    def __init__(self, encoder, max_batch_size=32, max_wait_ms=5, cache_name=None):
+        self.encoder = encoder
+        self.cache_name = cache_name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._requests = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def encode(self, texts):
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        future = Future()
+        self._requests.put((texts, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._requests.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                vectors = self.encoder.encode(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for request_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(request_texts)])
+                offset += len(request_texts)
+
+def make_encoder(model_name, backend="torch", threads=None):
+    if backend not in BACKENDS:
+        raise ValueError(f"지원하지 않는 인코더 백엔드: {backend} (사용 가능: {', '.join(BACKENDS)})")
+    if backend.startswith("onnx"):
+        return OnnxEncoder(model_name, quantize=backend.endswith("int8"), threads=threads)
+    return TorchEncoder(model_name, quantize=backend.endswith("int8"), threads=threads)
+
+# 모든 백엔드가 L2 정규화한 벡터를 돌려준다 (정규화하지 않던 예전 캐시 항목과 키가 겹치지 않게 캐시 키에 넣는다)
+NORMALIZATION = "l2"
+
+def cache_name(model_name, backend):
+    # 양자화/런타임이 다르면 벡터가 조금씩 달라지므로 백엔드와 정규화 방식마다 임베딩 캐시 키를 나눈다
+    return f"{model_name}:{backend}:{NORMALIZATION}"
+
+_init_lock = threading.Lock()
+
+def get_query_encoder(model_name):
+    # 모델 로딩/변환은 동시에 처음 호출돼도 한 번만 일어나게 한다
+    with _init_lock:
+        return _load_query_encoder(model_name)
+
+@lru_cache(maxsize=None)
+def _load_query_encoder(model_name):
+    backend = os.getenv("QUERY_ENCODER", "torch")
+    threads = int(os.getenv("QUERY_ENCODER_THREADS", "0")) or None
+    encoder = make_encoder(model_name, backend, threads)
+    return MicroBatcher(encoder, max_batch_size=int(os.getenv("QUERY_ENCODER_BATCH_SIZE", "32")),
+                        max_wait_ms=float(os.getenv("QUERY_ENCODER_BATCH_WAIT_MS", "5")),
+                        cache_name=cache_name(model_name, backend))
+
+PARITY_TEXTS = [
+    "소금 요리의 간을 맞추는 기본 조미료",
+    "올리브 오일 파스타를 볶을 때 쓰는 기름",
+    "다진 마늘",
+    "파마산 치즈 파스타 위에 뿌리는 숙성 치즈",
+    "방울토마토 소스와 샐러드에 쓰는 작은 토마토",
+    "fresh basil leaves",
+    "[풀무원] 국산콩 두부 300g",
+    "샛별배송 엑스트라버진 올리브오일 500ml",
+]
+
+def check_parity(model_name, backend, tolerance=0.99, texts=None, threads=None):
+    # 기준(PyTorch) 임베딩과 후보 백엔드 임베딩의 코사인 유사도를 비교한다
+    texts = texts or PARITY_TEXTS
+    reference = TorchEncoder(model_name, threads=threads)
+    candidate = make_encoder(model_name, backend, threads)
+
+    start = time.perf_counter()
+    expected = reference.encode(texts)
+    reference_time = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = candidate.encode(texts)
+    candidate_time = time.perf_counter() - start
+
+    if expected.shape != actual.shape:
+        raise ValueError(f"임베딩 차원이 다릅니다: {expected.shape} != {actual.shape}")
+    similarities = (expected * actual).sum(axis=1)
+    print(f"{backend}: 최소 코사인 유사도 {similarities.min():.4f}, 평균 {similarities.mean():.4f} "
+          f"(기준 {tolerance}), 인코딩 시간 {reference_time * 1000:.1f}ms → {candidate_time * 1000:.1f}ms")
+    return bool(similarities.min() >= tolerance)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="쿼리 인코더 백엔드 변환 및 정합성 확인")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--backend", choices=BACKENDS, default="onnx-int8")
+    parser.add_argument("--threads", type=int, help="인코더가 쓸 CPU 스레드 수")
+    parser.add_argument("--export", action="store_true", help="ONNX 모델만 내보내고 종료")
+    parser.add_argument("--check-parity", action="store_true", help="기준 PyTorch 임베딩과 코사인 유사도 비교")
+    parser.add_argument("--tolerance", type=float, default=0.99)
+    args = parser.parse_args()
+
+    if args.export:
+        model_dir, model_path = export_onnx(args.model, quantize=args.backend.endswith("int8"))
+        print(f"ONNX 모델 저장: {model_path}")
+    if args.check_parity:
+        if not check_parity(args.model, args.backend, args.tolerance, threads=args.threads):
+            sys.exit(1)
@@ -0,0 +1,166 @@
+import random
+import threading
+import time
+
+from instrumentation import observe
+
+# 호스트별 요청 속도 조절기 (AIMD).
+# 지연 시간과 오류율이 낮으면 초당 요청 수를 조금씩 올리고, 타임아웃이나 429/5xx가 나면 절반으로 줄인다.
+class RateController:
+    def __init__(self, initial_rate=1.0, min_rate=0.2, max_rate=20.0, increase=0.2, decrease=0.5,
+                 latency_target=3.0, error_threshold=0.05, decrease_cooldown=1.0):
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.error_threshold = error_threshold
+        self.decrease_cooldown = decrease_cooldown
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._last_decrease = 0.0
+        self._error_rate = 0.0
+        self._latency = None
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.throttled = 0
+        self.retries = 0
+
+    def acquire(self):
+        # 현재 속도에 맞춰 다음 요청 시각을 예약하고 그때까지 기다린다
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+            self.requests += 1
+        wait = slot - now
+        if wait > 0:
+            observe("rate_limit_wait", wait)
+            time.sleep(wait)
+
+    def record_success(self, latency):
+        with self._lock:
+            self.successes += 1
+            self._error_rate *= 0.9
+            self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+            if self._latency <= self.latency_target and self._error_rate <= self.error_threshold:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def record_failure(self, throttled=True):
+        with self._lock:
+            self.failures += 1
+            self._error_rate = 0.9 * self._error_rate + 0.1
+            if not throttled:
+                return
+            self.throttled += 1
+            # 동시에 실패한 요청들 때문에 속도가 한꺼번에 바닥까지 떨어지지 않도록 한다
+            now = time.monotonic()
+            if now - self._last_decrease >= self.decrease_cooldown:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._last_decrease = now
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def call(self, func, is_throttle=lambda e: True):
+        self.acquire()
+        start = time.monotonic()
+        try:
+            result = func()
+        except Exception as e:
+            self.record_failure(is_throttle(e))
+            raise
+        self.record_success(time.monotonic() - start)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rate": round(self.rate, 3),
+                "requests": self.requests,
+                "successes": self.successes,
+                "failures": self.failures,
+                "throttled": self.throttled,
+                "retries": self.retries,
+                "error_rate": round(self._error_rate, 4),
+                "avg_latency": round(self._latency, 3) if self._latency is not None else None,
+            }
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+def get_rate_controller(host, **kwargs):
+    # 같은 호스트로 가는 모든 요청이 하나의 조절기를 공유한다
+    with _controllers_lock:
+        if host not in _controllers:
+            _controllers[host] = RateController(**kwargs)
+        return _controllers[host]
+
+def rate_stats():
+    with _controllers_lock:
+        controllers = dict(_controllers)
+    return {host: controller.stats() for host, controller in controllers.items()}
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=60.0):
+    # 지수 백오프 + full jitter
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+def retry_with_backoff(func, controller=None, retry_on=(Exception,), is_throttle=lambda e: True,
+                       max_attempts=4, base_delay=1.0, max_delay=60.0, on_retry=None, should_retry=lambda e: True):
+    for attempt in range(max_attempts):
+        try:
+            if controller is not None:
+                return controller.call(func, is_throttle)
+            return func()
+        except retry_on as e:
+            if attempt == max_attempts - 1 or not should_retry(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if controller is not None:
+                controller.record_retry()
+            if on_retry is not None:
+                on_retry(e, delay)
+            time.sleep(delay)
+
+# 분당 요청 수(RPM)와 분당 토큰 수(TPM) 한도를 함께 지키는 토큰 버킷.
+# API 제공자가 정한 사용량 한도를 넘지 않도록 요청을 보내기 전에 acquire 한다.
+class UsageBudget:
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute or 0)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, tokens=0):
+        # 한 요청이 버킷 크기보다 많은 토큰을 쓰면 버킷이 가득 찼을 때 보낸다
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                waits = []
+                if self.requests_per_minute and self._requests < 1:
+                    waits.append((1 - self._requests) * 60 / self.requests_per_minute)
+                if self.tokens_per_minute and self._tokens < tokens:
+                    waits.append((tokens - self._tokens) * 60 / self.tokens_per_minute)
+                if not waits:
+                    if self.requests_per_minute:
+                        self._requests -= 1
+                    if self.tokens_per_minute:
+                        self._tokens -= tokens
+                    return
+                wait = max(waits)
+            time.sleep(wait)
@@ -0,0 +1,44 @@
+import numpy as np
+
+from vector_store import normalize_vectors
+
+def to_block(matches, dtype=np.float32):
+    # 인덱스 응답의 values를 연속된 (n, d) 배열 하나로 모은다 (업로드할 때 이미 정규화된 벡터)
+    if not matches:
+        return np.empty((0, 0), dtype=dtype)
+    return np.asarray([match['values'] for match in matches], dtype=dtype)
+
+def rerank(queries, candidate_blocks, top_k):
+    # 여러 재료의 후보를 한 배열로 이어 붙여 한 번의 einsum으로 점수를 매기고,
+    # 재료별로 argpartition으로 상위 top_k개만 골라 (후보 위치, 유사도) 목록을 돌려준다.
+    queries = normalize_vectors(queries)
+    if queries.ndim == 1:
+        queries = queries[None, :]
+    sizes = [len(block) for block in candidate_blocks]
+    blocks = [block for block in candidate_blocks if len(block)]
+    if not blocks:
+        return [[] for _ in candidate_blocks]
+
+    candidates = np.concatenate(blocks).astype(np.float32, copy=False)
+    if candidates.shape[1] != queries.shape[1]:
+        raise ValueError(
+            f"쿼리 임베딩 차원({queries.shape[1]})이 인덱스 임베딩 차원({candidates.shape[1]})과 다릅니다."
+        )
+
+    owners = np.repeat(np.arange(len(sizes)), sizes)
+    # 후보마다 자기 쿼리와의 내적만 계산한다 (전체 행렬곱 후 대각 성분을 고르면 쿼리 수만큼 낭비)
+    scores = np.einsum('ij,ij->i', candidates, queries[owners])
+
+    ranked = []
+    offset = 0
+    for size in sizes:
+        segment = scores[offset:offset + size]
+        offset += size
+        k = min(top_k, size)
+        if k <= 0:
+            ranked.append([])
+            continue
+        top = np.argpartition(-segment, k - 1)[:k]
+        top = top[np.argsort(-segment[top])]
+        ranked.append([(int(i), float(segment[i])) for i in top])
+    return ranked
@@ -0,0 +1,173 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+
+from embedding_cache import normalize_text
+
+INDEX_VERSION_PATH = "index_version.json"
+DEFAULT_TTL = 3600
+DEFAULT_SIZE = 4096
+
+# get()이 캐시에 없음을 알리는 값 (None은 "상품 없음"이라는 정상 결과라서 따로 둔다)
+MISSING = object()
+
+def index_version_path():
+    # 업로더(쓰는 쪽)와 결과 캐시(읽는 쪽)가 같은 파일을 보도록 경로는 여기서만 정한다
+    return os.getenv("INDEX_VERSION_PATH", INDEX_VERSION_PATH)
+
+def publish_index_version(path=None, **info):
+    # 업로더가 인덱스를 갱신할 때마다 새 버전을 기록한다. 이 버전이 바뀌면 검색 결과 캐시는 모두 무효가 된다.
+    path = path or index_version_path()
+    manifest = dict(info, version=uuid.uuid4().hex, published_at=time.time())
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return manifest["version"]
+
+def read_index_version(path=None):
+    path = path or index_version_path()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("version", "")
+    except (OSError, ValueError):
+        return ""
+
+def make_key(ingredient, top_k=None, filters=None):
+    return json.dumps([normalize_text(ingredient).lower(), top_k, filters or {}], sort_keys=True, ensure_ascii=False)
+
+# 재료 → 상품 검색 결과 캐시. 프로세스 안의 LRU와 (선택) 여러 프로세스가 함께 쓰는 SQLite 계층으로 되어 있고,
+# 항목은 TTL이 지나거나 인덱스 버전이 바뀌면 버린다. "찾을 수 없음"(None) 결과도 캐시한다.
+class ResultCache:
+    def __init__(self, maxsize=DEFAULT_SIZE, ttl=DEFAULT_TTL, path=None, version_path=None,
+                 version_check_interval=1.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version_path = version_path or index_version_path()
+        self.version_check_interval = version_check_interval
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            with self._conn:
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS results (
+                        key TEXT PRIMARY KEY,
+                        version TEXT NOT NULL,
+                        expires_at REAL NOT NULL,
+                        value TEXT NOT NULL
+                    )
+                """)
+        self._version = read_index_version(version_path)
+        self._version_checked = time.monotonic()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _check_version(self):
+        # 버전 파일은 version_check_interval마다 한 번만 읽는다
+        now = time.monotonic()
+        if now - self._version_checked < self.version_check_interval:
+            return
+        self._version_checked = now
+        version = read_index_version(self.version_path)
+        if version != self._version:
+            self._version = version
+            self._memory.clear()
+            self.invalidations += 1
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM results WHERE version != ?", (version,))
+
+    def get(self, key):
+        with self._lock:
+            self._check_version()
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.time():
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT expires_at, value FROM results WHERE key = ? AND version = ?", (key, self._version)
+                ).fetchone()
+                if row is not None and row[0] > time.time():
+                    value = json.loads(row[1])
+                    self._remember(key, row[0], value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return MISSING
+
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def put(self, key, value):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO results (key, version, expires_at, value) VALUES (?, ?, ?, ?)",
+                        (key, self._version, expires_at, json.dumps(value, ensure_ascii=False)),
+                    )
+
+    def get_or_compute(self, key, compute):
+        # compute가 예외를 던지면 캐시하지 않는다
+        value = self.get(key)
+        if value is MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "invalidations": self.invalidations,
+                "entries": len(self._memory),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM results")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+
+@lru_cache(maxsize=None)
+def get_result_cache(namespace):
+    # RESULT_CACHE_DIR를 지정하면 같은 디렉터리를 쓰는 프로세스끼리 디스크 계층을 공유한다
+    cache_dir = os.getenv("RESULT_CACHE_DIR")
+    return ResultCache(
+        maxsize=int(os.getenv("RESULT_CACHE_SIZE", DEFAULT_SIZE)),
+        ttl=float(os.getenv("RESULT_CACHE_TTL", DEFAULT_TTL)),
+        path=os.path.join(cache_dir, f"{namespace}.db") if cache_dir else None,
+        version_path=index_version_path(),
+    )
@@ -1,33 +1,32 @@
 
-import os
 import json
-from typing import List, Dict, Optional
-from openai import OpenAI
-from pinecone import Pinecone
-from sentence_transformers import SentenceTransformer
-from dotenv import load_dotenv
-from sklearn.metrics.pairwise import cosine_similarity
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict
 import numpy as np
+from clients import get_openai_client, get_vector_store
+from embedding_cache import get_embedding_cache
+from instrumentation import in_current_context, span
+from llm_cache import get_llm_cache, parse_json_content, record_llm_usage
+from ngram_index import get_ngram_index
+from product_parser import product_filter
+from query_encoder import get_query_encoder
+from reranker import rerank, to_block
+from result_cache import MISSING, get_result_cache, make_key
 
 
-# .env 파일에서 환경 변수 로드 (만약 .env 파일을 사용한다면)
-load_dotenv()
-
-# OpenAI 클라이언트 설정
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-# Pinecone 설정
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-index = pc.Index("kurlyproducts-klue-roberta-base") 
+# 벡터 인덱스 (VECTOR_STORE=local 이면 로컬 인덱스 사용)
+# OpenAI 클라이언트, 인덱스, 임베딩 모델은 import 시점이 아니라 처음 쓸 때 만들어서 프로세스 전체에서 공유한다
+INDEX_NAME = "kurlyproducts-klue-roberta-base"
 
 # ~~ 사용할 모델 설정
-model = SentenceTransformer('all-MiniLM-L6-v2')
+MODEL_NAME = 'all-MiniLM-L6-v2'
 
 # 검색에서 제외할 재료
 EXCLUDED_INGREDIENTS = {'물'}  # 제외할 재료들의 집합
 
-def extract_ingredients(recipe_text: str) -> List[str]:
-    prompt = f"""
+# 프롬프트 템플릿을 바꾸면 PROMPT_VERSION도 올려서 캐시된 추출 결과를 무효화한다
+PROMPT_TEMPLATE = """
     다음 레시피에서 필요한 모든 재료를 추출하여 JSON 형식의 리스트로 작성해주세요. 
     수량은 제외하고 재료명만 포함하세요. 또한, 각 재료에 대한 간단한 설명을 추가해주세요.
 
@@ -43,67 +42,140 @@ def extract_ingredients(recipe_text: str) -> List[str]:
         ]
     }}
     """
+PROMPT_VERSION = 1
+EXTRACTION_MODEL = "gpt-3.5-turbo"
 
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "당신은 레시피에서 재료를 추출하고 설명하는 전문가입니다."},
-            {"role": "user", "content": prompt}
-        ]
-    )
+def _request_ingredients(recipe_text: str) -> List[Dict[str, str]]:
+    with span("llm_call", model=EXTRACTION_MODEL, purpose="extract_ingredients"):
+        response = get_openai_client().chat.completions.create(
+            model=EXTRACTION_MODEL,
+            messages=[
+                {"role": "system", "content": "당신은 레시피에서 재료를 추출하고 설명하는 전문가입니다."},
+                {"role": "user", "content": PROMPT_TEMPLATE.format(recipe_text=recipe_text)}
+            ]
+        )
+    record_llm_usage(response, EXTRACTION_MODEL, "extract_ingredients")
 
-    # # (option) gpt-4o-mini 의 response format 고려
-    # text = response.choices[0].message.content
-    # if text.startswith('```json\n'):
-    #     text = text[8:-4]
-    # result = json.loads(text)
+    # gpt-3.5-turbo 는 JSON만, gpt-4o-mini 는 ```json 코드 블록으로 감싸서 응답하기도 한다
+    # 파싱에 실패하면 예외가 그대로 올라가서 캐시에 저장되지 않는다
+    return parse_json_content(response.choices[0].message.content)['ingredients']
 
-    # # gpt-3.5-turbo 의 response format 고려
-    result = json.loads(response.choices[0].message.content)
+def extract_ingredients(recipe_text: str) -> List[Dict[str, str]]:
+    # 같은 레시피는 캐시에서 바로 가져오고, 동시에 들어온 같은 레시피 요청은 LLM 호출 하나를 함께 기다린다
+    ingredients = get_llm_cache().get_or_compute(
+        EXTRACTION_MODEL, PROMPT_VERSION, recipe_text, lambda: _request_ingredients(recipe_text)
+    )
+    return [ingredient for ingredient in ingredients if ingredient['name'].lower() not in EXCLUDED_INGREDIENTS]
 
-    return [ingredient for ingredient in result['ingredients'] if ingredient['name'].lower() not in EXCLUDED_INGREDIENTS]
+def get_embeddings(texts: List[str]) -> List[List[float]]:
+    # QUERY_ENCODER로 백엔드(torch, torch-int8, onnx, onnx-int8)를 고르고, 동시 요청은 마이크로 배치로 묶인다
+    encoder = get_query_encoder(MODEL_NAME)
+    with span("query_embedding", model=encoder.cache_name):
+        return get_embedding_cache().get_or_compute(encoder.cache_name, texts,
+                                                    lambda texts: encoder.encode(texts).tolist())
 
 def get_embedding(text: str) -> List[float]:
-    return model.encode([text])[0].tolist()
-
-def search_products_in_pinecone(ingredient: Dict[str, str], top_k: int = 5) -> List[Dict[str, str]]:
-    query_embedding = get_embedding(f"{ingredient['name']} {ingredient['description']}")
-    results = index.query(
-        vector=query_embedding,
-        top_k=top_k * 2,  # 더 많은 결과를 가져와서 필터링
-        include_metadata=True
-    )
-    
+    return get_embeddings([text])[0]
+
+def _ingredient_query(ingredient: Dict[str, str]) -> str:
+    return f"{ingredient['name']} {ingredient['description']}"
+
+def _query_candidates(ingredient: Dict[str, str], candidates: List[str], query_embedding: List[float],
+                      top_k: int, **filters) -> List[Dict]:
+    # 상품명에 재료명이 포함된 후보 안에서만 벡터 검색하고, 재정렬에 쓸 벡터도 함께 받는다
+    with span("index_query", index=INDEX_NAME):
+        results = get_vector_store(INDEX_NAME).query(
+            vector=query_embedding,
+            top_k=min(top_k * 2, len(candidates)),
+            include_metadata=True,
+            include_values=True,
+            filter=product_filter(candidates, **filters)
+        )
     if not results['matches']:
         print(f"No matches found for ingredient: {ingredient['name']}")
-        return []
-    
-    filtered_matches = [
-        match for match in results['matches']
-        if ingredient['name'].lower() in match['metadata'].get('name', '').lower()
-    ]
-    
-    if not filtered_matches:
-        print(f"No filtered matches found for ingredient: {ingredient['name']}")
-        return []
-    
-    # 코사인 유사도 계산
-    product_embeddings = [match['values'] for match in filtered_matches]
-    similarities = cosine_similarity([query_embedding], product_embeddings)[0]
-    
-    # 유사도에 따라 정렬
-    sorted_products = sorted(zip(filtered_matches, similarities), key=lambda x: x[1], reverse=True)
-    
-    return [
-        {
-            'product_name': product['metadata'].get('name', 'Unknown Product'),
-            'discount_rate': product['metadata'].get('discount_rate', '0'),
-            'price': product['metadata'].get('price', 'N/A'),
-            'link': f"https://www.kurly.com/goods/{product['id']}",
-            'similarity': similarity
-        }
-        for product, similarity in sorted_products[:top_k]
-    ]
+    return results['matches']
+
+def search_products_batch(ingredients: List[Dict[str, str]], top_k: int = 5, max_candidates: int = 200,
+                          max_workers: int = 8, **filters) -> List:
+    # 레시피의 모든 재료를 한 번에 검색한다: 임베딩은 한 번에 만들고, 인덱스 질의는 동시에 보내고,
+    # 재정렬은 모든 재료의 후보를 모아 행렬 연산 한 번으로 한다.
+    # 결과는 재료 순서대로 상품 목록이고, 실패한 재료는 해당 자리에 예외 객체가 들어간다.
+    cache = get_result_cache("temp_extractor")
+    keys = [make_key(_ingredient_query(ingredient), top_k, dict(filters, max_candidates=max_candidates))
+            for ingredient in ingredients]
+    results = [cache.get(key) for key in keys]
+    misses = [i for i, result in enumerate(results) if result is MISSING]
+
+    name_index = get_ngram_index()
+    to_search = []
+    for i in misses:
+        candidates = name_index.search(ingredients[i]['name'], limit=max_candidates)
+        if candidates:
+            to_search.append((i, candidates))
+        else:
+            print(f"No filtered matches found for ingredient: {ingredients[i]['name']}")
+            results[i] = []
+            cache.put(keys[i], [])
+    if not to_search:
+        return results
+
+    try:
+        query_embeddings = get_embeddings([_ingredient_query(ingredients[i]) for i, _ in to_search])
+    except Exception as e:
+        for i, _ in to_search:
+            results[i] = e
+        return results
+
+    def _query(i, candidates, query_embedding):
+        try:
+            return _query_candidates(ingredients[i], candidates, query_embedding, top_k, **filters)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(to_search))) as executor:
+        futures = [executor.submit(in_current_context(_query), i, candidates, query_embedding)
+                   for (i, candidates), query_embedding in zip(to_search, query_embeddings)]
+        searched = []
+        for (i, _), query_embedding, future in zip(to_search, query_embeddings, futures):
+            matches = future.result()
+            if isinstance(matches, Exception):
+                results[i] = matches
+            else:
+                searched.append((i, query_embedding, matches))
+    if not searched:
+        return results
+
+    # 코사인 유사도 계산 (업로드할 때 정규화해 둔 벡터라서 내적만 하면 된다)
+    try:
+        with span("rerank"):
+            ranked = rerank(np.asarray([query_embedding for _, query_embedding, _ in searched], dtype=np.float32),
+                            [to_block(matches) for _, _, matches in searched], top_k)
+    except ValueError as e:
+        for i, _, _ in searched:
+            results[i] = e
+        return results
+
+    for (i, _, found), order in zip(searched, ranked):
+        results[i] = [
+            {
+                'product_name': name_index.names.get(found[j]['id']) or found[j]['metadata'].get('name', 'Unknown Product'),
+                'discount_rate': found[j]['metadata'].get('discount_rate', '0'),
+                'price': found[j]['metadata'].get('price', 'N/A'),
+                'link': f"https://www.kurly.com/goods/{found[j]['id']}",
+                'similarity': similarity
+            }
+            for j, similarity in order
+        ]
+        cache.put(keys[i], results[i])
+    return results
+
+def search_products_in_pinecone(ingredient: Dict[str, str], top_k: int = 5,
+                                max_candidates: int = 200, **filters) -> List[Dict[str, str]]:
+    # 같은 재료(이름+설명), top_k, 필터 조합은 결과 캐시에서 바로 돌려준다 (인덱스 버전이 바뀌면 무효화)
+    result = search_products_batch([ingredient], top_k, max_candidates, **filters)[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
 
 def generate_product_recommendations(ingredient: Dict[str, str], products: List[Dict[str, str]]) -> str:
     prompt = f"""
@@ -118,48 +190,109 @@ def generate_product_recommendations(ingredient: Dict[str, str], products: List[
     가격, 할인율, 상품의 특성 등을 고려하여 추천해주세요.
     """
 
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "당신은 요리 재료 전문가이며, 고객에게 최적의 상품을 추천하는 역할을 합니다."},
-            {"role": "user", "content": prompt}
-        ]
-    )
+    with span("llm_call", model="gpt-3.5-turbo", purpose="recommendation"):
+        response = get_openai_client().chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "당신은 요리 재료 전문가이며, 고객에게 최적의 상품을 추천하는 역할을 합니다."},
+                {"role": "user", "content": prompt}
+            ]
+        )
+    record_llm_usage(response, "gpt-3.5-turbo", "recommendation")
 
     return response.choices[0].message.content
 
-def process_recipe(recipe_text: str) -> List[Dict[str, str]]:
-    ingredients = extract_ingredients(recipe_text)
-    results = []
-    for ingredient in ingredients:
+def generate_batch_recommendations(items: List[Dict]) -> Dict[str, str]:
+    # 모든 재료와 후보 상품을 한 번의 요청으로 보내고 재료명 → 추천 문구를 돌려받는다
+    sections = "\n\n".join(
+        f"""    재료: "{item['ingredient']['name']}"
+    재료 설명: {item['ingredient']['description']}
+    상품 목록:
+    {json.dumps(item['products'], indent=2, ensure_ascii=False)}"""
+        for item in items
+    )
+    prompt = f"""
+    다음은 레시피의 재료별 설명과 이에 맞는 상품 목록입니다:
+
+{sections}
+
+    각 재료마다 요리에 가장 적합한 상품을 추천하고 그 이유를 설명해주세요. 
+    가격, 할인율, 상품의 특성 등을 고려하여 추천해주세요.
+
+    JSON 형식 예시:
+    {{"recommendations": [{{"ingredient": "재료1", "recommendation": "추천 상품과 이유"}}]}}
+    """
+
+    with span("llm_call", model="gpt-3.5-turbo", purpose="batch_recommendation"):
+        response = get_openai_client().chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "당신은 요리 재료 전문가이며, 고객에게 최적의 상품을 추천하는 역할을 합니다."},
+                {"role": "user", "content": prompt}
+            ]
+        )
+    record_llm_usage(response, "gpt-3.5-turbo", "batch_recommendation")
+
+    result = parse_json_content(response.choices[0].message.content)
+    return {item['ingredient']: item['recommendation'] for item in result['recommendations']}
+
+def _recipe_result(ingredient: Dict[str, str], products: List[Dict[str, str]], recommendation: str) -> Dict:
+    return {
+        'ingredient': ingredient['name'],
+        'description': ingredient['description'],
+        'recommended_products': products,
+        'recommendation': recommendation
+    }
+
+async def process_recipe_async(recipe_text: str, max_concurrency: int = 4) -> List[Dict[str, str]]:
+    # 재료별 검색을 동시에 실행한 뒤, 추천은 한 번의 묶음 요청으로 만든다.
+    # 묶음 요청이 실패하거나 빠진 재료가 있으면 그 재료만 동시 실행 수를 제한해서 하나씩 요청한다.
+    ingredients = await asyncio.to_thread(extract_ingredients, recipe_text)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    # 임베딩 한 번 + 동시 질의 + 한 번의 재정렬 (실패한 재료는 예외 객체로 돌아온다)
+    searches = await asyncio.to_thread(search_products_batch, ingredients, max_workers=max_concurrency)
+
+    results = [None] * len(ingredients)
+    to_recommend = []
+    for i, (ingredient, products) in enumerate(zip(ingredients, searches)):
+        if isinstance(products, Exception):
+            print(f"Error processing ingredient {ingredient['name']}: {str(products)}")
+            results[i] = _recipe_result(ingredient, [], '처리 중 오류가 발생했습니다.')
+            continue
+        print(products)
+        if products:
+            to_recommend.append((i, ingredient, products))
+        else:
+            results[i] = _recipe_result(ingredient, [], '해당 재료에 맞는 상품을 찾을 수 없습니다.')
+
+    recommendations = {}
+    if to_recommend:
         try:
-            products = search_products_in_pinecone(ingredient)
-            print(products)
-            if products:
-                recommendation = generate_product_recommendations(ingredient, products)
-                results.append({
-                    'ingredient': ingredient['name'],
-                    'description': ingredient['description'],
-                    'recommended_products': products,
-                    'recommendation': recommendation
-                })
-            else:
-                results.append({
-                    'ingredient': ingredient['name'],
-                    'description': ingredient['description'],
-                    'recommended_products': [],
-                    'recommendation': '해당 재료에 맞는 상품을 찾을 수 없습니다.'
-                })
+            recommendations = await asyncio.to_thread(
+                generate_batch_recommendations,
+                [{'ingredient': ingredient, 'products': products} for _, ingredient, products in to_recommend]
+            )
+        except Exception as e:
+            print(f"Batch recommendation failed ({e}); requesting recommendations per ingredient")
+
+    async def _recommend(i, ingredient, products):
+        recommendation = recommendations.get(ingredient['name'])
+        try:
+            if recommendation is None:
+                async with semaphore:
+                    recommendation = await asyncio.to_thread(generate_product_recommendations, ingredient, products)
+            results[i] = _recipe_result(ingredient, products, recommendation)
         except Exception as e:
             print(f"Error processing ingredient {ingredient['name']}: {str(e)}")
-            results.append({
-                'ingredient': ingredient['name'],
-                'description': ingredient['description'],
-                'recommended_products': [],
-                'recommendation': '처리 중 오류가 발생했습니다.'
-            })
+            results[i] = _recipe_result(ingredient, [], '처리 중 오류가 발생했습니다.')
+
+    await asyncio.gather(*(_recommend(i, ingredient, products) for i, ingredient, products in to_recommend))
     return results
 
+def process_recipe(recipe_text: str) -> List[Dict[str, str]]:
+    return asyncio.run(process_recipe_async(recipe_text))
+
 if __name__ == "__main__":
     recipe_text = """
     맛있는 토마토 파스타 만들기:
@@ -0,0 +1,76 @@
+import math
+import re
+from functools import lru_cache
+
+# 임베딩에 쓰는 모델과 그 모델의 입력 토큰 한도
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_TOKEN_LIMIT = 8191
+
+HANGUL_PATTERN = re.compile(r'[가-힣]')
+NON_SPACE_PATTERN = re.compile(r'\S')
+
+# OpenAI 임베딩 모델의 BPE(tiktoken)로 정확한 토큰 수를 센다
+class TiktokenCounter:
+    def __init__(self, model=EMBEDDING_MODEL):
+        import tiktoken
+        self.name = f"tiktoken:{model}"
+        self.encoding = tiktoken.encoding_for_model(model)
+
+    def count(self, text):
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def count_batch(self, texts):
+        return [len(tokens) for tokens in self.encoding.encode_batch(list(texts), disallowed_special=())]
+
+    def truncate(self, text, max_tokens):
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoding.decode(tokens[:max_tokens])
+
+# sentence-transformers 등 Hugging Face 토크나이저를 쓰는 모델용
+class HuggingFaceCounter:
+    def __init__(self, model_name):
+        from transformers import AutoTokenizer
+        self.name = f"hf:{model_name}"
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    def count(self, text):
+        return len(self.tokenizer(text, add_special_tokens=True)['input_ids'])
+
+    def count_batch(self, texts):
+        return [len(ids) for ids in self.tokenizer(list(texts), add_special_tokens=True)['input_ids']]
+
+    def truncate(self, text, max_tokens):
+        ids = self.tokenizer(text, add_special_tokens=False)['input_ids']
+        if len(ids) <= max_tokens:
+            return text
+        return self.tokenizer.decode(ids[:max_tokens])
+
+# 통계용 근사치. cl100k 기준 한글 음절은 대략 1토큰, 그 외 문자는 4자당 1토큰으로 본다.
+class ApproxCounter:
+    name = "approx"
+
+    def count(self, text):
+        hangul = len(HANGUL_PATTERN.findall(text))
+        others = len(NON_SPACE_PATTERN.findall(text)) - hangul
+        return hangul + math.ceil(others / 4)
+
+    def count_batch(self, texts):
+        return [self.count(text) for text in texts]
+
+    def truncate(self, text, max_tokens):
+        # 근사치이므로 문자 수 기준으로 보수적으로 자른다
+        return text if self.count(text) <= max_tokens else text[:max_tokens]
+
+@lru_cache(maxsize=None)
+def get_token_counter(spec="tiktoken"):
+    # "tiktoken", "tiktoken:<OpenAI 모델명>", "hf:<Hugging Face 모델명>", "approx"
+    backend, _, model = spec.partition(":")
+    if backend == "tiktoken":
+        return TiktokenCounter(model or EMBEDDING_MODEL)
+    if backend == "hf":
+        return HuggingFaceCounter(model or "sentence-transformers/all-MiniLM-L6-v2")
+    if backend == "approx":
+        return ApproxCounter()
+    raise ValueError(f"알 수 없는 토크나이저: {spec}")
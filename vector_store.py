@@ -0,0 +1,389 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+LOCAL_STORE_DIR = "vector_store"
+
+# upsert/query 형식은 Pinecone 인덱스와 같게 맞춘다.
+# upsert: (id, values, metadata) 튜플이나 {"id", "values", "metadata"} 딕셔너리 목록
+# query: {"matches": [{"id", "score", "metadata", "values"}, ...]}
+# 메서드가 빠진 백엔드는 질의 도중이 아니라 만들 때 실패한다.
+class VectorStore(ABC):
+    @abstractmethod
+    def upsert(self, vectors):
+        ...
+
+    @abstractmethod
+    def query(self, vector, top_k=10, include_metadata=False, include_values=False, filter=None):
+        ...
+
+    @abstractmethod
+    def fetch(self, ids):
+        ...
+
+class PineconeStore(VectorStore):
+    def __init__(self, index_name=None, index=None, api_key=None):
+        if index is None:
+            from pinecone import Pinecone
+            pc = Pinecone(api_key=api_key or os.getenv("PINECONE_API_KEY"))
+            index = pc.Index(index_name)
+        self.index = index
+
+    def upsert(self, vectors):
+        return self.index.upsert(vectors=vectors)
+
+    def query(self, vector, top_k=10, include_metadata=False, include_values=False, filter=None):
+        kwargs = {"vector": vector, "top_k": top_k, "include_metadata": include_metadata,
+                  "include_values": include_values}
+        if filter:
+            kwargs["filter"] = filter
+        return self.index.query(**kwargs)
+
+    def fetch(self, ids):
+        return self.index.fetch(ids=list(ids))
+
+# Pinecone 데이터 플레인 REST API(/vectors/upsert, /query, /vectors/fetch)를 직접 호출하는 클라이언트.
+# 실제 인덱스 호스트나 같은 프로토콜을 흉내 내는 로컬 스텁 서버(benchmarks/stub_servers.py)에 붙일 수 있다.
+class HttpStore(VectorStore):
+    def __init__(self, base_url, api_key=None, timeout=30):
+        import requests
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        if api_key:
+            self.session.headers["Api-Key"] = api_key
+
+    def _post(self, path, body):
+        response = self.session.post(f"{self.base_url}{path}", json=body, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def upsert(self, vectors):
+        items = []
+        for item in vectors:
+            if isinstance(item, dict):
+                items.append(item)
+            else:
+                items.append({"id": item[0], "values": list(item[1]), "metadata": item[2] if len(item) > 2 else {}})
+        return self._post("/vectors/upsert", {"vectors": items})
+
+    def query(self, vector, top_k=10, include_metadata=False, include_values=False, filter=None):
+        body = {"vector": list(vector), "topK": top_k, "includeMetadata": include_metadata,
+                "includeValues": include_values}
+        if filter:
+            body["filter"] = filter
+        return self._post("/query", body)
+
+    def fetch(self, ids):
+        response = self.session.get(f"{self.base_url}/vectors/fetch", params={"ids": list(ids)}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+def _compare(value, op, operand):
+    if op == "$eq":
+        return value == operand
+    if op == "$ne":
+        return value != operand
+    if op == "$in":
+        return value in operand
+    if op == "$nin":
+        return value not in operand
+    if value is None:
+        return False
+    if op == "$gt":
+        return value > operand
+    if op == "$gte":
+        return value >= operand
+    if op == "$lt":
+        return value < operand
+    if op == "$lte":
+        return value <= operand
+    raise ValueError(f"지원하지 않는 필터 연산자: {op}")
+
+def matches_filter(metadata, filter):
+    # Pinecone 메타데이터 필터 문법의 부분집합 ($eq, $ne, $in, $nin, $gt(e), $lt(e), $and, $or)
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if not all(_compare(value, op, operand) for op, operand in condition.items()):
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+def _filter_ids(filter):
+    # 필터가 (최상위나 $and 안에서) id를 $in/$eq로 묶고 있으면 그 ID 집합을 돌려준다
+    for key, condition in filter.items():
+        if key == "$and":
+            for sub in condition:
+                ids = _filter_ids(sub)
+                if ids is not None:
+                    return ids
+        elif key == "id":
+            if not isinstance(condition, dict):
+                return {str(condition)}
+            if "$in" in condition:
+                return {str(id_) for id_ in condition["$in"]}
+            if "$eq" in condition:
+                return {str(condition["$eq"])}
+    return None
+
+def normalize_vectors(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def _top_k(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+# 정규화한 float32 벡터를 메모리 맵 파일에, id와 메타데이터는 옆의 SQLite 테이블에 저장하는 로컬 인덱스.
+# 작은 코퍼스는 NumPy로 전수 검색하고, build_ivf()로 IVF 인덱스를 만들면 큰 코퍼스에서는 근사 검색을 한다.
+class LocalStore(VectorStore):
+    def __init__(self, path=LOCAL_STORE_DIR, dimension=None, nprobe=8, ivf_min_rows=20000):
+        self.path = path
+        self.nprobe = nprobe
+        self.ivf_min_rows = ivf_min_rows
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(path, "metadata.db"), check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS items (id TEXT PRIMARY KEY, row INTEGER UNIQUE, metadata TEXT)"
+            )
+
+        stored_dimension = self._conn.execute("SELECT value FROM info WHERE key = 'dimension'").fetchone()
+        if stored_dimension is not None:
+            self.dimension = int(stored_dimension[0])
+            if dimension is not None and dimension != self.dimension:
+                raise ValueError(f"인덱스 차원({self.dimension})과 요청한 차원({dimension})이 다릅니다.")
+        elif dimension is not None:
+            self.dimension = dimension
+            with self._conn:
+                self._conn.execute("INSERT INTO info VALUES ('dimension', ?)", (str(dimension),))
+        else:
+            raise ValueError("새 로컬 인덱스를 만들려면 dimension이 필요합니다.")
+
+        self._ids = []
+        self._metadata = []
+        self._rows = {}
+        for id_, row, metadata in self._conn.execute("SELECT id, row, metadata FROM items ORDER BY row"):
+            self._ids.append(id_)
+            self._metadata.append(json.loads(metadata) if metadata else {})
+            self._rows[id_] = row
+
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._capacity = 0
+        self._vectors = None
+        self._open_vectors(max(len(self._ids), 1024))
+        self._load_ivf()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _open_vectors(self, capacity):
+        # 용량이 부족하면 파일을 두 배씩 늘리고 메모리 맵을 다시 연다
+        row_bytes = self.dimension * 4
+        if not os.path.exists(self._vectors_path):
+            open(self._vectors_path, "wb").close()
+        current = os.path.getsize(self._vectors_path) // row_bytes
+        if current < capacity:
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(capacity * row_bytes)
+            current = capacity
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(current, self.dimension))
+        self._capacity = current
+
+    def upsert(self, vectors):
+        items = []
+        for item in vectors:
+            if isinstance(item, dict):
+                items.append((str(item["id"]), item["values"], item.get("metadata") or {}))
+            else:
+                id_, values = item[0], item[1]
+                items.append((str(id_), values, item[2] if len(item) > 2 else {}))
+        if not items:
+            return {"upserted_count": 0}
+
+        normalized = normalize_vectors([values for _, values, _ in items])
+        if normalized.shape[1] != self.dimension:
+            raise ValueError(f"벡터 차원({normalized.shape[1]})이 인덱스 차원({self.dimension})과 다릅니다.")
+
+        with self._lock:
+            rows = []
+            for id_, _, metadata in items:
+                row = self._rows.get(id_)
+                if row is None:
+                    row = len(self._ids)
+                    self._ids.append(id_)
+                    self._metadata.append(metadata)
+                    self._rows[id_] = row
+                else:
+                    self._metadata[row] = metadata
+                rows.append(row)
+
+            if len(self._ids) > self._capacity:
+                self._open_vectors(max(len(self._ids), self._capacity * 2))
+            self._vectors[rows] = normalized
+            self._vectors.flush()
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO items (id, row, metadata) VALUES (?, ?, ?)",
+                    [(id_, row, json.dumps(metadata, ensure_ascii=False))
+                     for (id_, _, metadata), row in zip(items, rows)],
+                )
+            if self._ivf is not None:
+                self._assign_to_ivf(np.asarray(rows), normalized)
+        return {"upserted_count": len(items)}
+
+    def _candidate_rows(self, query, filter):
+        count = len(self._ids)
+        ids = _filter_ids(filter) if filter else None
+        if ids is not None:
+            # 이름 후보처럼 ID 목록으로 좁힌 질의는 전체를 훑지 않고 그 행만 찾아서 나머지 조건을 본다
+            rows = sorted({self._rows[id_] for id_ in ids if id_ in self._rows})
+            return np.fromiter(
+                (row for row in rows if matches_filter(self._metadata[row], filter)), dtype=np.int64
+            )
+        if filter:
+            return np.fromiter(
+                (row for row in range(count) if matches_filter(self._metadata[row], filter)), dtype=np.int64
+            )
+        if self._ivf is not None and count >= self.ivf_min_rows:
+            centroids, assignments = self._ivf
+            probes = _top_k(centroids @ query, self.nprobe)
+            return np.flatnonzero(np.isin(assignments[:count], probes))
+        return None
+
+    def query(self, vector, top_k=10, include_metadata=False, include_values=False, filter=None):
+        query = normalize_vectors(vector)
+        if query.shape[-1] != self.dimension:
+            raise ValueError(f"쿼리 벡터 차원({query.shape[-1]})이 인덱스 차원({self.dimension})과 다릅니다.")
+
+        with self._lock:
+            count = len(self._ids)
+            candidates = self._candidate_rows(query, filter)
+            if candidates is None:
+                scores = self._vectors[:count] @ query
+                rows = _top_k(scores, top_k)
+                row_scores = scores[rows]
+            else:
+                scores = self._vectors[candidates] @ query if len(candidates) else np.empty(0, dtype=np.float32)
+                order = _top_k(scores, top_k)
+                rows, row_scores = candidates[order], scores[order]
+
+            matches = []
+            for row, score in zip(rows, row_scores):
+                match = {"id": self._ids[row], "score": float(score)}
+                if include_metadata:
+                    match["metadata"] = self._metadata[row]
+                if include_values:
+                    match["values"] = self._vectors[row].tolist()
+                matches.append(match)
+        return {"matches": matches}
+
+    def fetch(self, ids):
+        with self._lock:
+            vectors = {}
+            for id_ in ids:
+                row = self._rows.get(str(id_))
+                if row is not None:
+                    vectors[id_] = {"id": id_, "values": self._vectors[row].tolist(), "metadata": self._metadata[row]}
+        return {"vectors": vectors}
+
+    # IVF (inverted file) 근사 인덱스: 구면 k-means로 벡터를 nlist개 군집으로 나누고,
+    # 쿼리와 가까운 nprobe개 군집 안에서만 전수 검색한다.
+    def build_ivf(self, nlist=None, iterations=10, sample_size=100000, seed=0):
+        with self._lock:
+            count = len(self._ids)
+            if count == 0:
+                return
+            nlist = nlist or max(1, int(np.sqrt(count)))
+            vectors = self._vectors[:count]
+            rng = np.random.default_rng(seed)
+            sample = vectors[rng.choice(count, min(count, sample_size), replace=False)]
+            centroids = sample[rng.choice(len(sample), min(nlist, len(sample)), replace=False)].copy()
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                for c in range(len(centroids)):
+                    members = sample[labels == c]
+                    if len(members):
+                        centroids[c] = members.sum(axis=0)
+                centroids = normalize_vectors(centroids)
+
+            assignments = np.empty(self._capacity, dtype=np.int32)
+            for start in range(0, count, 65536):
+                end = min(start + 65536, count)
+                assignments[start:end] = np.argmax(vectors[start:end] @ centroids.T, axis=1)
+            self._ivf = (centroids, assignments)
+            np.savez(os.path.join(self.path, "ivf.npz"), centroids=centroids, assignments=assignments[:count])
+
+    def _load_ivf(self):
+        self._ivf = None
+        ivf_path = os.path.join(self.path, "ivf.npz")
+        if os.path.exists(ivf_path):
+            data = np.load(ivf_path)
+            assignments = np.zeros(self._capacity, dtype=np.int32)
+            stored = data["assignments"]
+            assignments[:len(stored)] = stored
+            self._ivf = (data["centroids"], assignments)
+            # IVF를 만든 뒤에 추가된 벡터도 가까운 군집에 배정한다
+            if len(stored) < len(self._ids):
+                rows = np.arange(len(stored), len(self._ids))
+                self._assign_to_ivf(rows, self._vectors[rows])
+
+    def _assign_to_ivf(self, rows, vectors):
+        centroids, assignments = self._ivf
+        if len(assignments) < self._capacity:
+            grown = np.zeros(self._capacity, dtype=np.int32)
+            grown[:len(assignments)] = assignments
+            assignments = grown
+        assignments[rows] = np.argmax(vectors @ centroids.T, axis=1)
+        self._ivf = (centroids, assignments)
+
+    def close(self):
+        with self._lock:
+            self._vectors.flush()
+            self._conn.close()
+
+def open_vector_store(index_name, dimension=None):
+    # VECTOR_STORE=local 이면 네트워크 없이 로컬 메모리 맵 인덱스를 쓴다
+    # VECTOR_STORE=http 이면 VECTOR_STORE_URL ("{index}" 자리에 인덱스 이름)의 REST 엔드포인트를 쓴다
+    backend = os.getenv("VECTOR_STORE", "pinecone")
+    if backend == "local":
+        root = os.getenv("LOCAL_VECTOR_STORE_DIR", LOCAL_STORE_DIR)
+        return LocalStore(os.path.join(root, index_name), dimension=dimension)
+    if backend == "http":
+        return HttpStore(os.environ["VECTOR_STORE_URL"].format(index=index_name), api_key=os.getenv("PINECONE_API_KEY"))
+    return PineconeStore(index_name)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="로컬 벡터 인덱스 관리")
+    parser.add_argument("path", help="로컬 인덱스 디렉터리")
+    parser.add_argument("--build-ivf", action="store_true", help="근사 검색용 IVF 인덱스 생성")
+    parser.add_argument("--nlist", type=int, help="IVF 군집 수 (기본값: sqrt(N))")
+    args = parser.parse_args()
+
+    store = LocalStore(args.path)
+    if args.build_ivf:
+        store.build_ivf(args.nlist)
+        print(f"{len(store)}개 벡터로 IVF 인덱스를 만들었습니다.")
+    store.close()
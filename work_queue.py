@@ -0,0 +1,121 @@
+import json
+import sqlite3
+import time
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+# SQLite 기반의 영속 작업 큐.
+# 워커는 작업을 일정 시간 동안 임대(lease)하고, 끝나면 ack 한다. 워커가 죽어서 임대 시간이 지나면
+# 다른 워커가 그 작업을 다시 가져간다. 같은 key의 작업은 한 번만 들어간다.
+# 여러 호스트가 공유 볼륨의 같은 파일을 쓸 수 있도록 WAL 대신 기본 롤백 저널을 사용한다.
+class WorkQueue:
+    def __init__(self, path='crawl_queue.db', lease_seconds=300, max_attempts=5):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT,
+                available_at REAL NOT NULL DEFAULT 0,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (status, priority, available_at)"
+        )
+
+    def put(self, kind, key, payload, priority=0):
+        # 새로 들어갔으면 True, 이미 같은 key의 작업이 있으면 False
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO tasks (key, kind, priority, payload) VALUES (?, ?, ?, ?)",
+            (key, kind, priority, json.dumps(payload, ensure_ascii=False)),
+        )
+        return cursor.rowcount == 1
+
+    def claim(self, owner):
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 임대 시간이 지난 작업은 다시 대기 상태로 돌린다
+            self._conn.execute(
+                "UPDATE tasks SET status = ?, owner = NULL WHERE status = ? AND lease_until < ?",
+                (PENDING, LEASED, now),
+            )
+            row = self._conn.execute(
+                """
+                SELECT key, kind, payload, attempts FROM tasks
+                WHERE status = ? AND available_at <= ?
+                ORDER BY priority, available_at
+                LIMIT 1
+                """,
+                (PENDING, now),
+            ).fetchone()
+            if row is None:
+                self._conn.execute("COMMIT")
+                return None
+
+            key, kind, payload, attempts = row
+            if attempts >= self.max_attempts:
+                # 계속 워커를 죽이는 작업은 더 이상 나눠주지 않는다
+                self._conn.execute("UPDATE tasks SET status = ? WHERE key = ?", (FAILED, key))
+                self._conn.execute("COMMIT")
+                return self.claim(owner)
+
+            self._conn.execute(
+                "UPDATE tasks SET status = ?, owner = ?, lease_until = ?, attempts = attempts + 1 WHERE key = ?",
+                (LEASED, owner, now + self.lease_seconds, key),
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return {"key": key, "kind": kind, "payload": json.loads(payload), "attempts": attempts + 1}
+
+    def ack(self, key, owner):
+        # 임대가 이미 다른 워커에게 넘어갔다면 False
+        cursor = self._conn.execute(
+            "UPDATE tasks SET status = ?, lease_until = NULL WHERE key = ? AND owner = ? AND status = ?",
+            (DONE, key, owner, LEASED),
+        )
+        return cursor.rowcount == 1
+
+    def nack(self, key, owner, error=None, retry_delay=0):
+        self._conn.execute(
+            """
+            UPDATE tasks SET
+                status = CASE WHEN attempts >= ? THEN ? ELSE ? END,
+                owner = NULL, lease_until = NULL, available_at = ?, last_error = ?
+            WHERE key = ? AND owner = ? AND status = ?
+            """,
+            (self.max_attempts, FAILED, PENDING, time.time() + retry_delay,
+             str(error) if error is not None else None, key, owner, LEASED),
+        )
+
+    def extend(self, key, owner):
+        self._conn.execute(
+            "UPDATE tasks SET lease_until = ? WHERE key = ? AND owner = ? AND status = ?",
+            (time.time() + self.lease_seconds, key, owner, LEASED),
+        )
+
+    def counts(self):
+        rows = self._conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def is_empty(self):
+        return self._conn.execute("SELECT 1 FROM tasks LIMIT 1").fetchone() is None
+
+    def close(self):
+        self._conn.close()